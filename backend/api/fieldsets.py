@@ -0,0 +1,29 @@
+from rest_framework import exceptions
+
+FIELDS_QUERY_PARAM = 'fields'
+OMIT_QUERY_PARAM = 'omit'
+
+
+def split_fields(value):
+    return [field.strip() for field in value.split(',') if field.strip()]
+
+
+def get_sparse_fields(request, allowed):
+    '''
+    Поля ответа по параметрам ?fields= и ?omit=.
+
+    Возвращает выбранные поля в порядке allowed; неизвестное поле
+    в любом из параметров даёт ошибку 400.
+    '''
+    selected = split_fields(request.query_params.get(FIELDS_QUERY_PARAM, ''))
+    omitted = split_fields(request.query_params.get(OMIT_QUERY_PARAM, ''))
+    unknown = [field for field in selected + omitted if field not in allowed]
+    if unknown:
+        raise exceptions.ValidationError(
+            {FIELDS_QUERY_PARAM: f'Неизвестные поля: {", ".join(unknown)}.'}
+        )
+    return tuple(
+        field
+        for field in allowed
+        if (not selected or field in selected) and field not in omitted
+    )
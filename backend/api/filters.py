@@ -1,14 +1,55 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework
+from django_filters.fields import MultipleChoiceField
 from rest_framework import filters
+from food.catalogue import get_tags_catalogue
 from food.models import Recipe
 from users.models import User
 
 
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tags_catalogue()]
+
+
+class TagSlugsField(MultipleChoiceField):
+    def valid_value(self, value):
+        return value in get_tags_catalogue((value,))
+
+
+class TagsFilter(rest_framework.MultipleChoiceFilter):
+    '''
+    Фильтр рецептов по slug тэгов (любой из переданных).
+
+    Допустимые значения берутся из закешированного каталога тэгов,
+    а совпадение проверяется подзапросом EXISTS по связующей таблице,
+    поэтому рецепты не дублируются и DISTINCT не нужен.
+    '''
+
+    field_class = TagSlugsField
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('choices', get_tag_choices)
+        kwargs.setdefault('distinct', False)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        catalogue = get_tags_catalogue(value)
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            tag_id__in=[
+                catalogue[slug] for slug in set(value) if slug in catalogue
+            ],
+        )
+        return qs.filter(Exists(recipe_tags))
+
+
 class RecipeFilter(rest_framework.FilterSet):
     '''Кастомный фильтор для рецепта.'''
 
     author = rest_framework.ModelChoiceFilter(queryset=User.objects.all())
-    tags = rest_framework.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagsFilter(field_name='tags__slug')
     is_favorited = rest_framework.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = rest_framework.BooleanFilter(
         method='get_recipe_in_shopping_cart'
@@ -0,0 +1,89 @@
+import base64
+import io
+import os
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializers import RecipeDetailSerializer
+from backend.parsers import ORJSONParser
+from backend.renderers import ORJSONRenderer, orjson
+from food.models import Recipe
+
+
+def measure(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает JSONRenderer/JSONParser с orjson-версиями '
+        'на данных RecipeDetailSerializer.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--image-mb', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(
+                self.style.WARNING('orjson не установлен, сравнение с DRF.')
+            )
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'recipies__ingredients'
+        )[: options['recipes']]
+        if not recipes:
+            raise CommandError(
+                'База пуста, сначала выполните manage.py seed_data.'
+            )
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        data = RecipeDetailSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+        repeat = options['repeat']
+
+        stdlib_ms, expected = measure(
+            lambda: JSONRenderer().render(data), repeat
+        )
+        orjson_ms, rendered = measure(
+            lambda: ORJSONRenderer().render(data), repeat
+        )
+        if rendered != expected:
+            raise CommandError('Вывод ORJSONRenderer отличается от DRF.')
+        self.stdout.write(
+            f'render {len(data)} рецептов, {len(expected)} байт: '
+            f'JSONRenderer {stdlib_ms:.2f} мс, '
+            f'ORJSONRenderer {orjson_ms:.2f} мс '
+            f'(x{stdlib_ms / orjson_ms:.1f})'
+        )
+
+        image = base64.b64encode(
+            os.urandom(options['image_mb'] * 1024 * 1024)
+        ).decode()
+        body = JSONRenderer().render(
+            {**data[0], 'image': f'data:image/png;base64,{image}'}
+        )
+        repeat = max(repeat // 10, 1)
+        stdlib_ms, expected = measure(
+            lambda: JSONParser().parse(io.BytesIO(body)), repeat
+        )
+        orjson_ms, parsed = measure(
+            lambda: ORJSONParser().parse(io.BytesIO(body)), repeat
+        )
+        if parsed != expected:
+            raise CommandError('Результат ORJSONParser отличается от DRF.')
+        self.stdout.write(
+            f'parse {len(body)} байт: JSONParser {stdlib_ms:.2f} мс, '
+            f'ORJSONParser {orjson_ms:.2f} мс (x{stdlib_ms / orjson_ms:.1f})'
+        )
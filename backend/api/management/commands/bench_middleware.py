@@ -0,0 +1,108 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.utils.module_loading import import_string
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+# Стек до разделения путей: те же middleware без пропуска для API.
+ORIGINAL_MIDDLEWARE = {
+    'backend.middleware.SessionMiddleware': (
+        'django.contrib.sessions.middleware.SessionMiddleware'
+    ),
+    'backend.middleware.AuthenticationMiddleware': (
+        'django.contrib.auth.middleware.AuthenticationMiddleware'
+    ),
+    'backend.middleware.MessageMiddleware': (
+        'django.contrib.messages.middleware.MessageMiddleware'
+    ),
+}
+FULL_MIDDLEWARE = [
+    ORIGINAL_MIDDLEWARE.get(path, path) for path in settings.MIDDLEWARE
+]
+
+
+def build_chain(middleware):
+    '''Цепочка middleware вокруг пустого представления, как в BaseHandler.'''
+    handler = convert_exception_to_response(lambda request: HttpResponse())
+    for path in reversed(middleware):
+        handler = convert_exception_to_response(import_string(path)(handler))
+    return handler
+
+
+class Command(BaseCommand):
+    help = (
+        'Накладные расходы middleware на запрос к /api/ с полным стеком '
+        'и с пропуском сессий, аутентификации Django и сообщений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5000)
+
+    def measure(self, handlers, make_request, repeat):
+        '''Медианы времени обработчиков; вызовы чередуются.'''
+        for _ in range(repeat // 10):
+            for handler in handlers:
+                handler(make_request())
+        timings = [[] for _ in handlers]
+        for _ in range(repeat):
+            for handler, handler_timings in zip(handlers, timings):
+                request = make_request()
+                started = time.perf_counter()
+                handler(request)
+                handler_timings.append(
+                    (time.perf_counter() - started) * 1_000_000
+                )
+        return [statistics.median(values) for values in timings]
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        factory = RequestFactory()
+        headers = {}
+        user = User.objects.order_by('id').first()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        # Браузер, заходивший в админку, шлёт cookie сессии и в API.
+        cookies = {settings.SESSION_COOKIE_NAME: 'x' * 32}
+
+        def api_request():
+            request = factory.get('/api/tags/', **headers)
+            request.COOKIES.update(cookies)
+            return request
+
+        stacks = (
+            ('полный стек', FULL_MIDDLEWARE),
+            ('без сессий для /api/', settings.MIDDLEWARE),
+        )
+        self.stdout.write('Только middleware вокруг пустого представления:')
+        medians = self.measure(
+            [build_chain(middleware) for _, middleware in stacks],
+            api_request,
+            repeat,
+        )
+        for (name, _), median in zip(stacks, medians):
+            self.stdout.write(f'  {name}: {median:.1f} мкс (медиана)')
+
+        self.stdout.write('Полный запрос GET /api/tags/ через WSGIHandler:')
+        environ = api_request().environ
+        environ['HTTP_COOKIE'] = f'{settings.SESSION_COOKIE_NAME}={"x" * 32}'
+        handlers = []
+        for _, middleware in stacks:
+            with override_settings(MIDDLEWARE=middleware):
+                application = WSGIHandler()
+            handlers.append(
+                lambda environ, application=application: application(
+                    environ, lambda *args: None
+                )
+            )
+        medians = self.measure(handlers, environ.copy, repeat // 5 or 1)
+        for (name, _), median in zip(stacks, medians):
+            self.stdout.write(f'  {name}: {median:.1f} мкс (медиана)')
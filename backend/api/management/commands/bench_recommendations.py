@@ -0,0 +1,94 @@
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIClient
+
+from food.models import Favorite
+from food.recommendations import (
+    build_neighbours,
+    deduplicate,
+    neighbours_index,
+    save_neighbours,
+)
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Время build_recommendations на синтетических взаимодействиях '
+        'и задержка /api/recipes/recommended/.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interactions', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--recipes', type=int, default=50_000)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        user_id = Favorite.objects.values_list('user_id', flat=True).first()
+        if user_id is None:
+            raise CommandError(
+                'База пуста, сначала выполните manage.py seed_data.'
+            )
+        rng = np.random.default_rng(0)
+        # Популярность рецептов убывает по степенному закону.
+        popularity = 1 / np.arange(1, options['recipes'] + 1) ** 0.8
+        users, items, weights = deduplicate(
+            rng.integers(1, options['users'] + 1, options['interactions']),
+            rng.choice(
+                np.arange(1, options['recipes'] + 1),
+                options['interactions'],
+                p=popularity / popularity.sum(),
+            ),
+            rng.choice(
+                np.array([1.0, 0.5], np.float32), options['interactions']
+            ),
+        )
+        started = time.perf_counter()
+        result = build_neighbours(users, items, weights)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Расчёт: {users.size} взаимодействий, {result.size} рецептов '
+            f'за {elapsed:.1f} с, файл {result.nbytes / 1024 / 1024:.0f} МБ.'
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recommendations.npy')
+            save_neighbours(result, path)
+            original_path = neighbours_index.path
+            neighbours_index.path = path
+            try:
+                histories = [
+                    rng.choice(items, 50).tolist()
+                    for _ in range(options['repeat'])
+                ]
+                timings = []
+                for history in histories:
+                    started = time.perf_counter()
+                    neighbours_index.recommend(history, [1.0] * 50, 12)
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f'Поиск по 50 рецептам истории: '
+                    f'{statistics.median(timings):.2f} мс (медиана).'
+                )
+
+                client = APIClient()
+                client.force_authenticate(User.objects.get(pk=user_id))
+                timings = []
+                for _ in range(options['repeat'] // 10 or 1):
+                    started = time.perf_counter()
+                    response = client.get('/api/recipes/recommended/')
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        raise CommandError(f'HTTP {response.status_code}')
+                self.stdout.write(
+                    f'/api/recipes/recommended/: '
+                    f'{statistics.median(timings):.1f} мс (медиана).'
+                )
+            finally:
+                neighbours_index.path = original_path
@@ -0,0 +1,129 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializers import (
+    IngredientsSerializer,
+    LeanIngredientsSerializer,
+    LeanRecipeListSerializer,
+    LeanSubscriptionsSerializer,
+    RecipeDetailSerializer,
+    UserGetSerializer,
+)
+from api.views import IngredientsViewSet, RecipeViewSet, UserFollowViewSet
+from users.models import User
+
+
+SLOW_PREFETCH = {
+    'recipes': ('author', 'tags', 'recipies__ingredients'),
+    'subscriptions': ('recipes',),
+    'ingredients': (),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает сериализацию страниц списков обычными и облегчёнными '
+        'сериализаторами и проверяет, что результат совпадает.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument(
+            '--anonymous',
+            action='store_true',
+            help=(
+                'Без флагов пользователя (и без подписок): '
+                'только стоимость сериализации.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        user = (
+            User.objects.filter(
+                favorites__isnull=False, followers__isnull=False
+            )
+            .order_by('id')
+            .first()
+        )
+        if user is None:
+            raise CommandError(
+                'База пуста, сначала выполните manage.py seed_data.'
+            )
+        page_size = options['page_size']
+
+        for name, viewset, slow, lean in (
+            (
+                'recipes',
+                RecipeViewSet,
+                RecipeDetailSerializer,
+                LeanRecipeListSerializer,
+            ),
+            (
+                'subscriptions',
+                UserFollowViewSet,
+                UserGetSerializer,
+                LeanSubscriptionsSerializer,
+            ),
+            (
+                'ingredients',
+                IngredientsViewSet,
+                IngredientsSerializer,
+                LeanIngredientsSerializer,
+            ),
+        ):
+            if options['anonymous'] and viewset is UserFollowViewSet:
+                continue
+            request = Request(
+                APIRequestFactory().get('/api/', {'recipes_limit': 3})
+            )
+            request.user = AnonymousUser() if options['anonymous'] else user
+            view = viewset(request=request, action='list', format_kwarg=None)
+            page = list(view.get_queryset()[:page_size])
+            ids = [getattr(item, 'id', None) or item['id'] for item in page]
+            # Обычные сериализаторы получают те же объекты с prefetch,
+            # чтобы сравнивалась сериализация, а не число JOIN.
+            slow_page = list(
+                slow.Meta.model.objects.filter(id__in=ids).prefetch_related(
+                    *SLOW_PREFETCH[name]
+                )
+            )
+            results = {}
+            for label, serializer_class, instances in (
+                ('drf', slow, slow_page),
+                ('lean', lean, page),
+            ):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(options['repeat']):
+                        data = serializer_class(
+                            instances, many=True, context={'request': request}
+                        ).data
+                    elapsed = (
+                        (time.perf_counter() - started)
+                        / options['repeat']
+                        * 1000
+                    )
+                results[label] = (
+                    elapsed,
+                    len(queries) // options['repeat'],
+                    sorted(data, key=lambda item: item['id']),
+                )
+            if results['drf'][2] != results['lean'][2]:
+                raise CommandError(
+                    f'{name}: вывод сериализаторов различается.'
+                )
+            drf_ms, drf_queries, _ = results['drf']
+            lean_ms, lean_queries, _ = results['lean']
+            self.stdout.write(
+                f'{name} ({len(page)} шт.): '
+                f'DRF {drf_ms:.2f} мс / {drf_queries} SQL, '
+                f'lean {lean_ms:.2f} мс / {lean_queries} SQL '
+                f'(x{drf_ms / lean_ms:.1f})'
+            )
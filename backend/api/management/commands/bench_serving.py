@@ -0,0 +1,107 @@
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+HOST = '127.0.0.1'
+
+
+def hammer(port, path, duration):
+    '''Шлёт запросы по keep-alive соединению, возвращает их число.'''
+    connection = http.client.HTTPConnection(HOST, port, timeout=30)
+    done = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f'{path}: HTTP {response.status}')
+        done += 1
+    connection.close()
+    return done
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError('gunicorn завершился при запуске.')
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError('gunicorn не запустился.')
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест: запускает gunicorn с gunicorn.conf.py при разном '
+        'числе воркеров и показывает, как растёт пропускная способность.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/recipes/')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            nargs='+',
+            default=sorted(
+                {1, 2, max(os.cpu_count() // 2, 1), os.cpu_count()}
+            ),
+        )
+
+    def handle(self, *args, **options):
+        port = options['port']
+        baseline = None
+        for workers in options['workers']:
+            process = subprocess.Popen(
+                [
+                    sys.executable,
+                    '-m',
+                    'gunicorn',
+                    '--config',
+                    'gunicorn.conf.py',
+                    '--access-logfile',
+                    '/dev/null',
+                    'backend.wsgi:application',
+                ],
+                cwd=settings.BASE_DIR,
+                env={
+                    **os.environ,
+                    'GUNICORN_BIND': f'{HOST}:{port}',
+                    'GUNICORN_WORKERS': str(workers),
+                    'API_THROTTLING': 'False',
+                },
+            )
+            try:
+                wait_for_port(port, process)
+                hammer(port, options['path'], 1)
+                with ProcessPoolExecutor(options['concurrency']) as pool:
+                    done = sum(
+                        pool.map(
+                            hammer,
+                            [port] * options['concurrency'],
+                            [options['path']] * options['concurrency'],
+                            [options['duration']] * options['concurrency'],
+                        )
+                    )
+            finally:
+                process.terminate()
+                process.wait()
+            rps = done / options['duration']
+            baseline = baseline or rps
+            self.stdout.write(
+                f'workers={workers}: {rps:.0f} запросов/с '
+                f'(x{rps / baseline:.1f})'
+            )
@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from djoser.serializers import UserCreateSerializer
+
+from api.serializers import UserRegistrationSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость регистрации через сериализатор djoser '
+        'и UserRegistrationSerializer.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=200)
+        parser.add_argument(
+            '--real-hasher',
+            action='store_true',
+            help='Хешировать пароли настоящим PBKDF2 (по умолчанию MD5, '
+            'чтобы сравнивать только валидацию и запросы).',
+        )
+
+    def handle(self, *args, **options):
+        hashers = (
+            {}
+            if options['real_hasher']
+            else {
+                'PASSWORD_HASHERS': [
+                    'django.contrib.auth.hashers.MD5PasswordHasher'
+                ]
+            }
+        )
+        with override_settings(**hashers):
+            for serializer_class in (
+                UserCreateSerializer,
+                UserRegistrationSerializer,
+            ):
+                self.run(serializer_class, options['signups'])
+
+    def run(self, serializer_class, signups):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    for number in range(signups):
+                        serializer = serializer_class(
+                            data={
+                                'email': f'bench{number}@example.com',
+                                'username': f'bench{number}',
+                                'first_name': 'Bench',
+                                'last_name': str(number),
+                                'password': f'Bench-{number}-password',
+                            }
+                        )
+                        serializer.is_valid(raise_exception=True)
+                        serializer.save()
+                    raise Rollback
+            except Rollback:
+                pass
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{serializer_class.__name__}: '
+            f'{signups / elapsed:.0f} регистраций/с, '
+            f'{len(queries) / signups:.1f} SQL на регистрацию'
+        )
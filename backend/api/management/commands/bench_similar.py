@@ -0,0 +1,70 @@
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from food.similarity import READ_CHUNK, SimilarityIndex
+
+INGREDIENTS = 2188
+TEMPLATE_SIZE = 8
+
+
+class Command(BaseCommand):
+    help = (
+        'Сборка индекса похожих рецептов и время поиска на синтетических '
+        'рецептах: вариации общих шаблонов плюс случайные ингредиенты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        count = options['recipes']
+        templates = rng.integers(0, max(count // 10, 1), count)
+        ingredients = rng.integers(
+            1, INGREDIENTS + 1, (templates.max() + 1, TEMPLATE_SIZE)
+        )[templates]
+        # Из шаблона остаётся ~80% ингредиентов, добавляются 2 случайных.
+        keep = rng.random((count, TEMPLATE_SIZE)) < 0.8
+        extras = rng.integers(1, INGREDIENTS + 1, (count, 2))
+        ingredients = np.concatenate((ingredients, extras), axis=1)
+        keep = np.concatenate((keep, np.ones((count, 2), bool)), axis=1)
+        recipes = np.repeat(np.arange(1, count + 1), keep.sum(axis=1))
+        ingredients = ingredients[keep]
+
+        def chunks():
+            for start in range(0, recipes.size, READ_CHUNK):
+                end = start + READ_CHUNK
+                yield recipes[start:end], ingredients[start:end]
+
+        with tempfile.TemporaryDirectory() as directory:
+            index = SimilarityIndex(directory)
+            started = time.perf_counter()
+            index.rebuild(chunks(), count)
+            self.stdout.write(
+                f'Сборка: {count} рецептов, {recipes.size} ингредиентов '
+                f'за {time.perf_counter() - started:.1f} с.'
+            )
+            for recipe_id in range(1, 1001):
+                index.update(
+                    recipe_id, ingredients[recipes == recipe_id].tolist()
+                )
+            timings, found = [], []
+            for recipe_id in rng.integers(1, count + 1, options['repeat']):
+                started = time.perf_counter()
+                similar = index.similar(int(recipe_id), 6)
+                timings.append((time.perf_counter() - started) * 1000)
+                if similar:
+                    same = templates[np.asarray(similar) - 1]
+                    found.append((same == templates[recipe_id - 1]).mean())
+            timings.sort()
+            self.stdout.write(
+                f'Поиск (1000 рецептов в pending): медиана '
+                f'{statistics.median(timings):.2f} мс, p99 '
+                f'{timings[int(len(timings) * 0.99)]:.2f} мс; '
+                f'из того же шаблона {np.mean(found):.0%} найденных.'
+            )
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from food.models import Follow
+from users.models import User
+
+
+CASES = (
+    ('/api/recipes/', {}),
+    ('/api/recipes/', {'omit': 'ingredients,text'}),
+    ('/api/recipes/', {'fields': 'id,name,image,cooking_time,author'}),
+    ('/api/recipes/', {'fields': 'id,name,image,cooking_time'}),
+    ('/api/users/subscriptions/', {}),
+    ('/api/users/subscriptions/', {'omit': 'recipes'}),
+    ('/api/users/subscriptions/', {'fields': 'id,username,recipes_count'}),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает размер ответа, число запросов и время списков '
+        'рецептов и подписок с параметрами fields и omit.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(
+            id__in=Follow.objects.values('user')
+        ).first()
+        if user is None:
+            raise CommandError(
+                'База пуста, сначала выполните manage.py seed_data.'
+            )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        for path, params in CASES:
+            params = {'limit': options['page_size'], **params}
+            # Первый запрос прогревает кеш тэгов и соединение.
+            client.get(path, params)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    response = client.get(path, params)
+                elapsed = (
+                    (time.perf_counter() - started) / options['repeat'] * 1000
+                )
+            if response.status_code != 200:
+                raise CommandError(f'{path}: ответ {response.status_code}.')
+            selection = ', '.join(
+                f'{name}={value}'
+                for name, value in params.items()
+                if name != 'limit'
+            )
+            self.stdout.write(
+                f'{path} [{selection or "все поля"}]: '
+                f'{len(response.content) / 1024:.1f} КБ, '
+                f'{len(queries) // options["repeat"]} SQL, '
+                f'{elapsed:.2f} мс'
+            )
@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Запускается в отдельном интерпретаторе: мастер при --preload загружает
+# приложение до fork, иначе каждый воркер загружает его сам после fork.
+WORKER_SCRIPT = '''
+import json, os, resource, sys, time
+
+def load():
+    started = time.perf_counter()
+    from backend.wsgi import application  # noqa
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+    return time.perf_counter() - started
+
+def private_kb():
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            return sum(
+                int(line.split()[1]) for line in smaps
+                if line.startswith(('Private_Clean', 'Private_Dirty'))
+            )
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+preload = os.environ['PRELOAD_APP'] == '1'
+master_seconds = load() if preload else 0.0
+for _ in range(int(sys.argv[1])):
+    pid = os.fork()
+    if pid == 0:
+        seconds = master_seconds if preload else load()
+        print(json.dumps({
+            'seconds': seconds,
+            'private_kb': private_kb(),
+            'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'reportlab': 'reportlab' in sys.modules,
+        }), flush=True)
+        os._exit(0)
+    os.waitpid(pid, 0)
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время загрузки приложения и память на воркер '
+        'с предзагрузкой в мастере и без неё.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        for preload in ('0', '1'):
+            output = subprocess.run(
+                [sys.executable, '-c', WORKER_SCRIPT, str(options['workers'])],
+                cwd=settings.BASE_DIR,
+                env={**os.environ, 'PRELOAD_APP': preload},
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            workers = [json.loads(line) for line in output.splitlines()]
+            seconds = max(worker['seconds'] for worker in workers)
+            private = sum(w['private_kb'] for w in workers) / len(workers)
+            rss = sum(w['rss_kb'] for w in workers) / len(workers)
+            self.stdout.write(
+                f'preload={preload}: загрузка {seconds * 1000:.0f} мс, '
+                f'на воркер private {private / 1024:.1f} МБ, '
+                f'RSS {rss / 1024:.1f} МБ, '
+                f'reportlab загружен: {workers[0]["reportlab"]}'
+            )
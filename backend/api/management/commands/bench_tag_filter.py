@@ -0,0 +1,55 @@
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django_filters import rest_framework
+
+from api.filters import RecipeFilter
+from food.models import Recipe, Tag
+from users.models import User
+
+
+class LegacyRecipeFilter(RecipeFilter):
+    '''Прежний фильтр: DISTINCT по всем значениям slug и JOIN с тэгами.'''
+
+    tags = rest_framework.AllValuesMultipleFilter(field_name='tags__slug')
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает фильтрацию рецептов по всем тэгам: старую и новую.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=6)
+
+    def handle(self, *args, **options):
+        slugs = list(Tag.objects.values_list('slug', flat=True))
+        if not slugs or not Recipe.objects.exists():
+            raise CommandError(
+                'База пуста, сначала выполните manage.py seed_data.'
+            )
+        request = SimpleNamespace(user=User.objects.first())
+        queryset = Recipe.objects.order_by('-id')
+
+        for name, filterset_class in (
+            ('legacy', LegacyRecipeFilter),
+            ('exists', RecipeFilter),
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    qs = filterset_class(
+                        {'tags': slugs}, queryset=queryset, request=request
+                    ).qs
+                    count = qs.count()
+                    ids = list(
+                        qs.values_list('id', flat=True)[: options['page_size']]
+                    )
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{name}: {elapsed / options["repeat"] * 1000:.2f} мс/запрос, '
+                f'{len(queries) // options["repeat"]} SQL/запрос, '
+                f'count={count}, page={ids}'
+            )
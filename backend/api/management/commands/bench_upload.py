@@ -0,0 +1,185 @@
+import base64
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from PIL import Image
+from rest_framework_simplejwt.tokens import AccessToken
+
+from food.models import Ingredient, Recipe, Tag
+from users.models import User
+
+BOUNDARY = 'bench-upload-boundary'
+MODES = ('json', 'multipart')
+
+
+def read_rss_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def make_image(path, megabytes):
+    '''PNG из шума: почти не сжимается, размер близок к заданному.'''
+    side = int((megabytes * 1024 * 1024 / 3) ** 0.5)
+    Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(
+        path, compress_level=1
+    )
+
+
+def write_json_body(body, fields, image_path):
+    '''JSON с картинкой в base64, кодируется по частям прямо в файл.'''
+    prefix = json.dumps({**fields, 'image': ''})[:-3]
+    body.write(f'{prefix}"data:image/png;base64,'.encode())
+    with open(image_path, 'rb') as image:
+        while chunk := image.read(3 * 64 * 1024):
+            body.write(base64.b64encode(chunk))
+    body.write(b'"}')
+    return 'application/json'
+
+
+def write_multipart_body(body, fields, image_path):
+    for name, value in fields.items():
+        values = value if name == 'tags' else [value]
+        for item in values:
+            if not isinstance(item, str):
+                item = json.dumps(item)
+            body.write(
+                f'--{BOUNDARY}\r\nContent-Disposition: form-data; '
+                f'name="{name}"\r\n\r\n{item}\r\n'.encode()
+            )
+    body.write(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="image"; '
+        f'filename="bench.png"\r\nContent-Type: image/png\r\n\r\n'.encode()
+    )
+    with open(image_path, 'rb') as image:
+        while chunk := image.read(64 * 1024):
+            body.write(chunk)
+    body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+    return f'multipart/form-data; boundary={BOUNDARY}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает загрузку картинки рецепта в base64 внутри JSON '
+        'и в multipart/form-data: время запроса и пик памяти процесса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--image-mb', type=int, default=15)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--mode', choices=MODES, help='Служебный.')
+        parser.add_argument('--image', help='Служебный.')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            return self.run_mode(options)
+        if not (User.objects.exists() and Ingredient.objects.exists()):
+            raise CommandError(
+                'База пуста, сначала выполните manage.py seed_data.'
+            )
+        with tempfile.TemporaryDirectory() as directory:
+            image_path = os.path.join(directory, 'bench.png')
+            make_image(image_path, options['image_mb'])
+            self.stdout.write(
+                f'Картинка {os.path.getsize(image_path) / 1024 / 1024:.1f} '
+                f'МБ, повторов {options["repeat"]}.'
+            )
+            for mode in MODES:
+                # Каждый способ в отдельном процессе: пик памяти
+                # процесса нельзя сбросить.
+                result = subprocess.run(
+                    [
+                        sys.executable,
+                        os.path.join(settings.BASE_DIR, 'manage.py'),
+                        'bench_upload',
+                        f'--mode={mode}',
+                        f'--image={image_path}',
+                        f'--repeat={options["repeat"]}',
+                    ],
+                    env={**os.environ, 'API_THROTTLING': 'False'},
+                    capture_output=True,
+                    text=True,
+                )
+                if result.returncode:
+                    raise CommandError(result.stderr)
+                self.stdout.write(result.stdout.rstrip())
+
+    def run_mode(self, options):
+        user = User.objects.order_by('id').first()
+        fields = {
+            'name': 'bench_upload',
+            'text': 'bench_upload',
+            'cooking_time': 10,
+            'tags': list(Tag.objects.values_list('id', flat=True)[:2]),
+            'ingredients': [
+                {'id': id, 'amount': 10}
+                for id in Ingredient.objects.values_list('id', flat=True)[:3]
+            ],
+        }
+        write_body = (
+            write_json_body
+            if options['mode'] == 'json'
+            else write_multipart_body
+        )
+        application = get_wsgi_application()
+        token = str(AccessToken.for_user(user))
+
+        def call(method, path, body=None, content_type=''):
+            environ = {
+                'REQUEST_METHOD': method,
+                'PATH_INFO': path,
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'HTTP_HOST': 'localhost',
+                'HTTP_AUTHORIZATION': f'Bearer {token}',
+                'CONTENT_TYPE': content_type,
+                'CONTENT_LENGTH': str(os.fstat(body.fileno()).st_size)
+                if body
+                else '0',
+                'wsgi.input': body,
+                'wsgi.url_scheme': 'http',
+                'wsgi.errors': sys.stderr,
+            }
+            statuses = []
+            response = application(
+                environ, lambda status, headers: statuses.append(status)
+            )
+            for _ in response:
+                pass
+            response.close()
+            return statuses[0]
+
+        with tempfile.TemporaryFile() as body:
+            content_type = write_body(body, fields, options['image'])
+            body_mb = body.tell() / 1024 / 1024
+            call('GET', '/api/recipes/')
+            baseline_kb = read_rss_kb('VmRSS')
+            timings = []
+            for _ in range(options['repeat']):
+                body.seek(0)
+                started = time.perf_counter()
+                status = call('POST', '/api/recipes/', body, content_type)
+                timings.append((time.perf_counter() - started) * 1000)
+                if not status.startswith('201'):
+                    raise CommandError(f'{options["mode"]}: HTTP {status}')
+                for recipe in Recipe.objects.filter(
+                    author=user, name=fields['name']
+                ):
+                    recipe.delete()
+            peak_kb = read_rss_kb('VmHWM')
+        self.stdout.write(
+            f'{options["mode"]:>9}: тело {body_mb:.1f} МБ, '
+            f'{statistics.median(timings):.0f} мс, '
+            f'пик памяти +{(peak_kb - baseline_kb) / 1024:.0f} МБ'
+        )
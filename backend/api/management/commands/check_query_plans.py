@@ -0,0 +1,134 @@
+import re
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from api.filters import RecipeFilter
+from food.models import (
+    Favorite,
+    Follow,
+    Recipe,
+    RecipeIngredient,
+    Shopping,
+    Tag,
+)
+from users.models import User
+
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)(?:\s+AS \w+)?$', re.M),
+}
+SQLITE_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для основных запросов API на заполненной базе '
+        'и завершается с ошибкой, если какой-то из них читает таблицу '
+        'последовательным сканированием.'
+    )
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f'EXPLAIN для {connection.vendor} не поддерживается.'
+            )
+        user = (
+            User.objects.filter(
+                favorites__isnull=False, followers__isnull=False
+            )
+            .order_by('id')
+            .first()
+        )
+        recipe = Recipe.objects.order_by('id').first()
+        if user is None or recipe is None:
+            raise CommandError(
+                'База пуста, сначала выполните manage.py seed_data.'
+            )
+
+        failed = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset in self.get_queries(user, recipe):
+                plan = queryset.explain()
+                tables = set(pattern.findall(plan))
+                if self.is_sqlite_pk_walk(queryset, plan):
+                    tables.discard(queryset.model._meta.db_table)
+                status = 'SEQ SCAN ' + ', '.join(tables) if tables else 'ok'
+                self.stdout.write(f'{name}: {status}')
+                if options['verbosity'] > 1:
+                    self.stdout.write(plan)
+                if tables:
+                    failed.append(name)
+
+        if failed:
+            raise CommandError(
+                'Последовательное сканирование в запросах: '
+                + ', '.join(failed)
+            )
+        self.stdout.write(
+            self.style.SUCCESS('Все запросы используют индексы.')
+        )
+
+    @staticmethod
+    def is_sqlite_pk_walk(queryset, plan):
+        '''
+        Страница ленты: SQLite показывает обход таблицы по rowid
+        в порядке ORDER BY id до LIMIT как SCAN; в PostgreSQL это
+        Index Scan Backward по первичному ключу. Запрос без LIMIT
+        читал бы всю таблицу и исключением не считается.
+        '''
+        order_by = queryset.query.order_by
+        return (
+            connection.vendor == 'sqlite'
+            and SQLITE_SORT not in plan
+            and queryset.query.high_mark is not None
+            and bool(order_by)
+            and order_by[0].lstrip('-') in ('id', 'pk')
+        )
+
+    def get_queries(self, user, recipe):
+        request = SimpleNamespace(user=user)
+        recipes = Recipe.objects.order_by('-id')
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+
+        def recipe_filter(**data):
+            # Как в API: первая страница ленты.
+            return RecipeFilter(data, queryset=recipes, request=request).qs[
+                :page_size
+            ]
+
+        yield 'recipes?author', recipe_filter(author=recipe.author_id)
+        yield 'recipes?tags', recipe_filter(tags=slugs)
+        yield 'recipes?is_favorited', recipe_filter(is_favorited=True)
+        yield 'recipes?is_in_shopping_cart', recipe_filter(
+            is_in_shopping_cart=True
+        )
+        yield 'recipe ingredients', RecipeIngredient.objects.filter(
+            recipe=recipe
+        ).select_related('ingredients')
+        yield 'recipe tags', Tag.objects.filter(recipe=recipe)
+        yield 'is_favorited', Favorite.objects.filter(user=user, recipe=recipe)
+        yield 'is_in_shopping_cart', Shopping.objects.filter(
+            user=user, recipe=recipe
+        )
+        yield 'is_subscribed', Follow.objects.filter(
+            user=user, following=recipe.author
+        )
+        yield 'recipe favorited by', Favorite.objects.filter(recipe=recipe)
+        yield 'followers', Follow.objects.filter(following=user)
+        yield 'subscriptions', User.objects.filter(
+            id__in=Follow.objects.filter(user=user).values('following')
+        )
+        yield 'download_shopping_cart', (
+            RecipeIngredient.objects.filter(recipe__shopping__user=user)
+            .values('ingredients__name', 'ingredients__measurement_unit')
+            .annotate(total_amount=Sum('amount'))
+        )
@@ -0,0 +1,93 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand
+
+from backend.slow_queries import aggregate, slow_query_log
+
+SORT_KEYS = ('total', 'count', 'max', 'p95', 'mean')
+CSV_FIELDS = (
+    'fingerprint',
+    'count',
+    'total',
+    'mean',
+    'p95',
+    'max',
+    'first_seen',
+    'last_seen',
+    'views',
+    'origins',
+    'params',
+    'sql',
+    'plan',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка журнала медленных запросов по отпечаткам SQL: время, '
+        'представления, места вызова, параметры и план.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=SORT_KEYS, default='total')
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько отпечатков показать; 0 - все.',
+        )
+        parser.add_argument(
+            '--format', choices=('text', 'json', 'csv'), default='text'
+        )
+
+    def handle(self, *args, **options):
+        report = sorted(
+            aggregate(slow_query_log.read()),
+            key=lambda group: group[options['sort']],
+            reverse=True,
+        )
+        if options['limit']:
+            report = report[: options['limit']]
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        elif options['format'] == 'csv':
+            writer = csv.DictWriter(self.stdout, CSV_FIELDS)
+            writer.writeheader()
+            for group in report:
+                writer.writerow(
+                    {
+                        **group,
+                        'views': json.dumps(
+                            group['views'], ensure_ascii=False
+                        ),
+                        'origins': json.dumps(
+                            group['origins'], ensure_ascii=False
+                        ),
+                        'params': json.dumps(group['params'], default=str),
+                    }
+                )
+        else:
+            self.write_text(report, options['verbosity'])
+
+    def write_text(self, report, verbosity):
+        if not report:
+            self.stdout.write('Медленных запросов в журнале нет.')
+            return
+        for group in report:
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(
+                    f'{group["fingerprint"]}: {group["count"]} раз, '
+                    f'всего {group["total"]} мс, среднее {group["mean"]}, '
+                    f'p95 {group["p95"]}, максимум {group["max"]} мс'
+                )
+            )
+            self.stdout.write(f'  {group["sql"]}')
+            for view, count in group['views']:
+                self.stdout.write(f'  представление: {view} ({count})')
+            for origin, count in group['origins']:
+                self.stdout.write(f'  вызов: {origin} ({count})')
+            if group['params'] is not None:
+                self.stdout.write(f'  параметры: {group["params"]}')
+            if group['plan'] and verbosity > 1:
+                self.stdout.write('  ' + group['plan'].replace('\n', '\n  '))
@@ -0,0 +1,53 @@
+import os
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FONT_NAME = 'Verdana'
+FONT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'fonts/',
+    'Verdana.ttf',
+)
+
+
+def register_fonts():
+    '''Регистрирует шрифт один раз на процесс.'''
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def draw_shopping_cart(output, shopping_list):
+    '''Рисует PDF со списком покупок в output.'''
+    register_fonts()
+
+    p = canvas.Canvas(output)
+    p.setFont(FONT_NAME, 15)
+
+    p.setFillColorRGB(0.2, 0.4, 0.6)
+    p.rect(0, 805, 600, 40, fill=True)
+
+    p.setFillColorRGB(1, 1, 1)
+    p.drawString(210, 820, 'Корзина покупок:')
+
+    y_position = 750
+
+    p.setFillColorRGB(0, 0, 0)
+    for ingredient_data in shopping_list:
+        ingredient = (
+            f"{ingredient_data['name']} "
+            f"({ingredient_data['measurement_unit']})"
+        )
+        amount = ingredient_data['amount']
+        p.drawString(70, y_position, f'{ingredient} — {amount}')
+        y_position -= 15
+
+    p.setFillColorRGB(0.2, 0.4, 0.6)
+    p.rect(0, 55, 600, 40, fill=True)
+
+    p.setFillColorRGB(1, 1, 1)
+    p.drawString(100, 70, ".-~*´¨¯¨`*·~-. ® «Фудграм» .-~*´¨¯¨`*·~-.")
+
+    p.showPage()
+    p.save()
@@ -1,9 +1,17 @@
 import base64
+import json
+from functools import partial
+from operator import attrgetter
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
-from django.db import transaction
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from djoser.serializers import UserCreateSerializer
+from django.utils.encoding import filepath_to_uri
+from django.utils.functional import cached_property
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
+from rest_framework.utils import html
+from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
 
 from backend.settings import (
     REGEX_USERNAME,
@@ -23,8 +31,9 @@ from food.models import (
     Shopping,
     Tag,
 )
+from food.similarity import index_recipe
 from users.models import User
-from api.validators import validate_email, validate_username
+from api.validators import get_taken_user_fields, validate_unique_user
 
 
 class CreateUserSerializer(serializers.ModelSerializer):
@@ -56,20 +65,68 @@ class CreateUserSerializer(serializers.ModelSerializer):
             'is_subscribed',
             'password',
         )
-        validators = (
-            validate_email,
-            validate_username,
-        )
+        validators = (validate_unique_user,)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
-        if user.is_authenticated:
+        if user.is_authenticated and user != obj:
             return Follow.objects.filter(user=user, following=obj).exists()
         return False
 
 
+class UserRegistrationSerializer(UserCreateSerializer):
+    '''
+    Сериализатор регистрации djoser с одной проверкой уникальности.
+
+    Вместо двух UniqueValidator email и username проверяются одним
+    запросом; гонку при одновременной регистрации ловит ограничение
+    уникальности в БД.
+    '''
+
+    unique_fields = ('email', 'username')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in self.unique_fields:
+            fields[name].validators = [
+                validator
+                for validator in fields[name].validators
+                if not isinstance(validator, UniqueValidator)
+            ]
+        return fields
+
+    def validate_unique(self, attrs):
+        taken = get_taken_user_fields(attrs['email'], attrs['username'])
+        errors = {
+            name: [User._meta.get_field(name).error_messages['unique']]
+            for name in self.unique_fields
+            if any(user[name] == attrs[name] for user in taken)
+        }
+        if errors:
+            raise serializers.ValidationError(errors)
+
+    def validate(self, attrs):
+        self.validate_unique(attrs)
+        return super().validate(attrs)
+
+    def create(self, validated_data):
+        try:
+            return self.perform_create(validated_data)
+        except IntegrityError:
+            self.validate_unique(validated_data)
+            self.fail('cannot_create_user')
+
+
 class Base64ImageField(serializers.ImageField):
-    '''Сериализатор для обработки картинок.'''
+    '''
+    Сериализатор для обработки картинок.
+
+    Принимает data:image;base64 из JSON или файл из multipart/form-data:
+    большой файл Django сохраняет во временный файл по частям,
+    не держа запрос в памяти.
+    '''
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
@@ -126,6 +183,23 @@ class RecipeIngridientsSerializer(serializers.ModelSerializer):
         )
 
 
+class JSONFormListSerializer(serializers.ListSerializer):
+    '''
+    Список, который в multipart/form-data можно передать одним полем
+    с JSON: ingredients=[{"id": 1, "amount": 10}].
+    '''
+
+    def get_value(self, dictionary):
+        if html.is_html_input(dictionary) and self.field_name in dictionary:
+            value = dictionary[self.field_name]
+            if isinstance(value, str):
+                try:
+                    return json.loads(value)
+                except ValueError:
+                    return value
+        return super().get_value(dictionary)
+
+
 class RecipeIngredientAmountSerializer(serializers.ModelSerializer):
     '''Сериализатор для принятия запроса ингредиета в сериализаторе рецепта.'''
 
@@ -135,6 +209,7 @@ class RecipeIngredientAmountSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = JSONFormListSerializer
 
 
 class RecipeDetailSerializer(serializers.ModelSerializer):
@@ -266,6 +341,13 @@ class RecipeSerializer(serializers.ModelSerializer):
             recipe_ingredient.save()
 
         recipe.tags.set(tags_data)
+        transaction.on_commit(
+            partial(
+                index_recipe,
+                recipe.id,
+                [meaning.get('id') for meaning in ingredients_data],
+            )
+        )
 
         return recipe
 
@@ -280,7 +362,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         instance.save()
 
-        ingredients_data = validated_data.get('ingredients')
+        ingredients_data = validated_data.get('recipies')
         if ingredients_data:
             instance.recipies.all().delete()
 
@@ -294,6 +376,13 @@ class RecipeSerializer(serializers.ModelSerializer):
                     amount=amount,
                 )
                 recipe_ingredient.save()
+            transaction.on_commit(
+                partial(
+                    index_recipe,
+                    instance.id,
+                    [meaning.get('id') for meaning in ingredients_data],
+                )
+            )
 
         tags_data = validated_data.get('tags')
         if tags_data is not None:
@@ -418,6 +507,25 @@ class SubscribeSerializer(CreateUserSerializer):
         ).exists()
 
 
+def apply_recipes_limit(data, request):
+    '''Обрезает список рецептов подписки по параметру recipes_limit.'''
+    recipes_limit = request.query_params.get('recipes_limit')
+
+    if recipes_limit and 'recipes' in data:
+        try:
+            recipes_limit_int = int(recipes_limit)
+            if recipes_limit_int <= 0:
+                raise ValueError(
+                    "recipes_limit должен быть положительным числом"
+                )
+
+            data['recipes'] = data['recipes'][:recipes_limit_int]
+        except ValueError:
+            data['error'] = 'Неверное значение для recipes_limit'
+
+    return data
+
+
 class UserGetSerializer(serializers.ModelSerializer):
     '''Сериализатор для просмотра подписок.'''
 
@@ -449,20 +557,196 @@ class UserGetSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        recipes_limit = self.context.get('request').query_params.get(
-            'recipes_limit'
-        )
+        return apply_recipes_limit(data, self.context.get('request'))
 
-        if recipes_limit:
-            try:
-                recipes_limit_int = int(recipes_limit)
-                if recipes_limit_int <= 0:
-                    raise ValueError(
-                        "recipes_limit должен быть положительным числом"
-                    )
 
-                data['recipes'] = data['recipes'][:recipes_limit_int]
-            except ValueError:
-                data['error'] = 'Неверное значение для recipes_limit'
+class LeanSerializer(serializers.BaseSerializer):
+    '''
+    Базовый сериализатор только для чтения без полей DRF.
 
-        return data
+    Выдаёт поля field_names (или подмножество из context['fields']):
+    значение берётся методом get_<поле>, а если его нет, то атрибутом
+    объекта с тем же именем.
+    '''
+
+    field_names = ()
+
+    @cached_property
+    def media_url(self):
+        '''Абсолютный адрес хранилища, вычисляется один раз на список.'''
+        request = self.context.get('request')
+        if request is None:
+            return default_storage.base_url
+        return request.build_absolute_uri(default_storage.base_url)
+
+    @cached_property
+    def getters(self):
+        '''Пары (поле, функция значения), собираются один раз на список.'''
+        fields = self.context.get('fields')
+        if fields is None:
+            fields = self.field_names
+        return [
+            (name, getattr(self, f'get_{name}', attrgetter(name)))
+            for name in fields
+        ]
+
+    def get_image_url(self, image):
+        '''Повторяет ImageField.to_representation без создания поля.'''
+        if not image:
+            return None
+        return self.media_url + filepath_to_uri(image.name)
+
+    def to_representation(self, instance):
+        return {name: getter(instance) for name, getter in self.getters}
+
+
+class LeanRecipeListSerializer(LeanSerializer):
+    '''
+    Облегчённый сериализатор рецептов только для чтения.
+
+    Выдаёт то же, что и RecipeDetailSerializer, но собирает словари
+    напрямую, без вложенных сериализаторов и полей DRF. Ожидает
+    queryset из RecipeViewSet.get_lean_queryset: автор через
+    select_related, тэги и ингредиенты в prefetched_tags
+    и prefetched_ingredients, флаги через annotate.
+    '''
+
+    field_names = (
+        'id',
+        'tags',
+        'author',
+        'ingredients',
+        'is_favorited',
+        'is_in_shopping_cart',
+        'name',
+        'image',
+        'text',
+        'cooking_time',
+    )
+
+    def get_tags(self, instance):
+        return [
+            {
+                'id': tag.id,
+                'name': tag.name,
+                'color': tag.color,
+                'slug': tag.slug,
+            }
+            for tag in instance.prefetched_tags
+        ]
+
+    def get_author(self, instance):
+        author = instance.author
+        return {
+            'email': author.email,
+            'id': author.id,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'is_subscribed': instance.author_is_subscribed,
+        }
+
+    def get_ingredients(self, instance):
+        return [
+            {
+                'id': item.ingredients_id,
+                'name': item.ingredients.name,
+                'measurement_unit': item.ingredients.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in instance.prefetched_ingredients
+        ]
+
+    def get_image(self, instance):
+        return self.get_image_url(instance.image)
+
+
+class LeanRecipeBundleSerializer(LeanSerializer):
+    '''
+    Сериализатор страницы рецепта одним ответом.
+
+    Разделы выбираются параметрами fields и omit; ожидает рецепт из
+    RecipeViewSet.get_bundle_queryset и списки рецептов
+    в more_by_author и related.
+    '''
+
+    field_names = ('recipe', 'author', 'more_by_author', 'related')
+
+    def get_recipe_card(self, recipe):
+        return {
+            'id': recipe.id,
+            'name': recipe.name,
+            'image': self.get_image_url(recipe.image),
+            'cooking_time': recipe.cooking_time,
+        }
+
+    def get_recipe(self, instance):
+        return LeanRecipeListSerializer(
+            instance, context={**self.context, 'fields': None}
+        ).data
+
+    def get_author(self, instance):
+        author = instance.author
+        return {
+            'email': author.email,
+            'id': author.id,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'is_subscribed': instance.author_is_subscribed,
+            'recipes_count': instance.author_recipes_count,
+        }
+
+    def get_more_by_author(self, instance):
+        return [
+            self.get_recipe_card(recipe) for recipe in instance.more_by_author
+        ]
+
+    def get_related(self, instance):
+        return [self.get_recipe_card(recipe) for recipe in instance.related]
+
+
+class LeanSubscriptionsSerializer(LeanSerializer):
+    '''
+    Облегчённый сериализатор списка подписок только для чтения.
+
+    Выдаёт то же, что и UserGetSerializer; ожидает рецепты
+    в prefetched_recipes, is_subscribed и recipes_count через annotate.
+    '''
+
+    field_names = (
+        'id',
+        'username',
+        'email',
+        'first_name',
+        'last_name',
+        'is_subscribed',
+        'recipes',
+        'recipes_count',
+    )
+
+    def get_recipes(self, instance):
+        return [
+            {
+                'id': recipe.id,
+                'name': recipe.name,
+                'image': self.get_image_url(recipe.image),
+                'cooking_time': recipe.cooking_time,
+            }
+            for recipe in instance.prefetched_recipes
+        ]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        return apply_recipes_limit(data, self.context.get('request'))
+
+
+class LeanIngredientsSerializer(LeanSerializer):
+    '''Сериализатор каталога ингредиентов по строкам .values().'''
+
+    def to_representation(self, instance):
+        return {
+            'id': instance['id'],
+            'name': instance['name'],
+            'measurement_unit': instance['measurement_unit'],
+        }
@@ -2,6 +2,7 @@ from django.urls import include, path, re_path
 from rest_framework import routers
 
 from api.views import (
+    ExportView,
     IngredientsViewSet,
     RecipeViewSet,
     ShoppingViewSet,
@@ -35,6 +36,7 @@ router_v1.register(r'users', UserCreateViewSet, basename='users')
 
 
 urlpatterns = [
+    path('exports/<str:name>/', ExportView.as_view(), name='exports'),
     path('', include(router_v1.urls)),
     path('auth/', include('djoser.urls')),
     re_path('auth/', include('djoser.urls.authtoken')),
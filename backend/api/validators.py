@@ -1,26 +1,37 @@
+from django.db.models import Q
 from rest_framework import serializers
 from users.models import User
 
 
-def validate_username(data):
-    '''Проверка уникальности username.'''
-    username = data['username']
-    email = data['email']
-
-    if User.objects.exclude(email=email).filter(username=username).exists():
-        raise serializers.ValidationError(
-            'Пользователь с таким именем уже существует.'
-        )
-    return data
+def get_taken_user_fields(email, username):
+    '''
+    Одним запросом находит пользователей с таким email или username
+    и возвращает их поля email и username.
+    '''
+    return list(
+        User.objects.filter(Q(email=email) | Q(username=username)).values(
+            'email', 'username'
+        )[:2]
+    )
 
 
-def validate_email(data):
-    '''Проверка уникальности email.'''
+def validate_unique_user(data):
+    '''Проверка уникальности email и username.'''
     username = data['username']
     email = data['email']
+    taken = get_taken_user_fields(email, username)
 
-    if User.objects.exclude(username=username).filter(email=email).exists():
-        raise serializers.ValidationError(
-            'Пользователь с таким email уже существует.'
-        )
+    errors = []
+    if any(
+        user['email'] == email and user['username'] != username
+        for user in taken
+    ):
+        errors.append('Пользователь с таким email уже существует.')
+    if any(
+        user['username'] == username and user['email'] != email
+        for user in taken
+    ):
+        errors.append('Пользователь с таким именем уже существует.')
+    if errors:
+        raise serializers.ValidationError(errors)
     return data
@@ -1,28 +1,48 @@
-import os
-
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from django.db.models import F
-from django.db.models import Sum
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce
 from rest_framework import (
     mixins,
+    negotiation,
     permissions,
     status,
+    views,
     viewsets,
     exceptions,
 )
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
-
-from backend.settings import SHOPPING_CART_FILE_NAME
+from backend.pagination import LimitPageNumberOrCursorPagination
+from backend.settings import (
+    BUNDLE_RECIPES_LIMIT,
+    MAX_BUNDLE_RECIPES_LIMIT,
+    MAX_RECOMMENDATIONS_LIMIT,
+    RECOMMENDATIONS_HISTORY,
+    MAX_SIMILAR_RECIPES_LIMIT,
+    RECOMMENDATIONS_LIMIT,
+    SHOPPING_CART_FILE_NAME,
+    SIMILAR_RECIPES_LIMIT,
+)
 
 from users.models import User
+from food.exports import EXPORT_FORMATS, EXPORTS, iter_export
+from food.recommendations import get_user_history, neighbours_index
+from food.shopping import get_shopping_list
+from food.similarity import similarity_index
 from food.models import (
     Favorite,
     Follow,
@@ -33,6 +53,7 @@ from food.models import (
     Tag,
 )
 
+from api.fieldsets import get_sparse_fields
 from api.filters import (
     RecipeFilter,
     CustomIngredientsSearchFilter,
@@ -43,17 +64,49 @@ from api.serializers import (
     FavoriteSerializer,
     FavoriteShoppingSerializer,
     IngredientsSerializer,
-    RecipeDetailSerializer,
+    LeanIngredientsSerializer,
+    LeanRecipeBundleSerializer,
+    LeanRecipeListSerializer,
+    LeanSubscriptionsSerializer,
     RecipeSerializer,
     ShoppingSerializer,
     SubscribeSerializer,
     TagsSerializer,
-    UserGetSerializer,
 )
 
 
 RESPONSE_CONTENT_TYPE = 'application/pdf'
 
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+RECIPE_COLUMNS = ('name', 'image', 'text', 'cooking_time')
+USER_COLUMNS = ('email', 'username', 'first_name', 'last_name')
+
+
+def get_recipe_flags(user):
+    '''Аннотации флагов рецепта для текущего пользователя.'''
+    if not user.is_authenticated:
+        false = Value(False, output_field=BooleanField())
+        return {
+            'is_favorited': false,
+            'is_in_shopping_cart': false,
+            'author_is_subscribed': false,
+        }
+    return {
+        'is_favorited': Exists(
+            Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+        ),
+        'is_in_shopping_cart': Exists(
+            Shopping.objects.filter(user=user, recipe=OuterRef('pk'))
+        ),
+        'author_is_subscribed': Exists(
+            Follow.objects.filter(user=user, following=OuterRef('author'))
+        ),
+    }
+
 
 class RetrieveListViewSet(
     mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet
@@ -80,6 +133,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    throttle_scope = None
+    anon_throttle_scope = 'anon_feed'
 
     def get_permissions(self):
         if self.action == 'create':
@@ -90,14 +145,214 @@ class RecipeViewSet(viewsets.ModelViewSet):
             raise exceptions.MethodNotAllowed('PUT method is not allowed')
         return super().get_permissions()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'recommended', 'similar'):
+            queryset = self.get_lean_queryset(
+                queryset, self.get_sparse_fields()
+            )
+        elif self.action == 'bundle':
+            queryset = self.get_bundle_queryset(queryset)
+        return queryset
+
+    def get_lean_queryset(self, queryset, fields=None):
+        '''
+        Рецепты для LeanRecipeListSerializer.
+
+        Загружаются только нужные полям столбцы, JOIN, prefetch
+        и флаги: без ingredients нет запроса ингредиентов,
+        без text столбец не читается.
+        '''
+        if fields is None:
+            fields = LeanRecipeListSerializer.field_names
+        columns = [name for name in RECIPE_COLUMNS if name in fields]
+        flags = {
+            name: flag
+            for name, flag in get_recipe_flags(self.request.user).items()
+            if name in fields
+        }
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+            columns += ['author'] + [
+                f'author__{name}' for name in USER_COLUMNS
+            ]
+            flags['author_is_subscribed'] = get_recipe_flags(
+                self.request.user
+            )['author_is_subscribed']
+        prefetches = []
+        if 'tags' in fields:
+            prefetches.append(Prefetch('tags', to_attr='prefetched_tags'))
+        if 'ingredients' in fields:
+            prefetches.append(
+                Prefetch(
+                    'recipies',
+                    queryset=RecipeIngredient.objects.select_related(
+                        'ingredients'
+                    ),
+                    to_attr='prefetched_ingredients',
+                )
+            )
+        return (
+            queryset.only('id', *columns)
+            .prefetch_related(*prefetches)
+            .annotate(**flags)
+        )
+
+    def get_bundle_queryset(self, queryset):
+        '''Загружает только то, что нужно выбранным разделам bundle.'''
+        fields = self.get_sparse_fields()
+        if 'recipe' in fields:
+            queryset = self.get_lean_queryset(queryset)
+        else:
+            queryset = queryset.select_related('author').annotate(
+                **get_recipe_flags(self.request.user)
+            )
+        if 'author' in fields:
+            author_recipes = (
+                Recipe.objects.filter(author=OuterRef('author'))
+                .values('author')
+                .annotate(count=Count('*'))
+                .values('count')
+            )
+            queryset = queryset.annotate(
+                author_recipes_count=Coalesce(
+                    Subquery(author_recipes, output_field=IntegerField()), 0
+                )
+            )
+        return queryset
+
+    def get_sparse_fields(self):
+        return get_sparse_fields(
+            self.request, self.get_serializer_class().field_names
+        )
+
+    def get_query_limit(self, name, default, maximum):
+        limit = self.request.query_params.get(name)
+        if not limit:
+            return default
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = None
+        if limit is None or not 0 < limit <= maximum:
+            raise exceptions.ValidationError(
+                {name: f'Должно быть числом от 1 до {maximum}.'}
+            )
+        return limit
+
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
-            return RecipeDetailSerializer
+        if self.action in ('list', 'retrieve', 'recommended', 'similar'):
+            return LeanRecipeListSerializer
+        if self.action == 'bundle':
+            return LeanRecipeBundleSerializer
         return RecipeSerializer
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=True, methods=('get',))
+    def bundle(self, request, pk=None):
+        '''
+        Страница рецепта одним ответом: рецепт, автор с числом рецептов
+        и подпиской, другие рецепты автора и похожие по тэгам.
+        '''
+        fields = self.get_sparse_fields()
+        recipes_limit = self.get_query_limit(
+            'recipes_limit', BUNDLE_RECIPES_LIMIT, MAX_BUNDLE_RECIPES_LIMIT
+        )
+        recipe = self.get_object()
+        cards = Recipe.objects.only('id', 'name', 'image', 'cooking_time')
+        if 'more_by_author' in fields:
+            recipe.more_by_author = (
+                cards.filter(author=recipe.author_id)
+                .exclude(pk=recipe.pk)
+                .order_by('-id')[:recipes_limit]
+            )
+        if 'related' in fields:
+            if 'recipe' in fields:
+                tag_ids = [tag.id for tag in recipe.prefetched_tags]
+            else:
+                tag_ids = list(
+                    Recipe.tags.through.objects.filter(
+                        recipe_id=recipe.pk
+                    ).values_list('tag_id', flat=True)
+                )
+            recipe.related = (
+                cards.filter(
+                    Exists(
+                        Recipe.tags.through.objects.filter(
+                            recipe_id=OuterRef('pk'), tag_id__in=tag_ids
+                        )
+                    )
+                )
+                .exclude(pk=recipe.pk)
+                .order_by('-id')[:recipes_limit]
+                if tag_ids
+                else []
+            )
+        serializer = self.get_serializer(recipe)
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def recommended(self, request):
+        '''
+        Рецепты для пользователя по соседям его последних избранных
+        и покупок из build_recommendations; при нехватке - популярные.
+        '''
+        limit = self.get_query_limit(
+            'limit', RECOMMENDATIONS_LIMIT, MAX_RECOMMENDATIONS_LIMIT
+        )
+        history, weights = get_user_history(
+            request.user, RECOMMENDATIONS_HISTORY
+        )
+        ids = neighbours_index.recommend(history, weights, limit)
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[id] for id in ids if id in recipes], many=True
+        )
+        return Response(serializer.data)
+
+    @action(detail=True, methods=('get',))
+    def similar(self, request, pk=None):
+        '''
+        Рецепты с похожим набором ингредиентов из индекса MinHash/LSH.
+
+        Запрос только читает индекс: рецепт попадает в него при
+        сохранении через API или при manage.py build_similarity.
+        '''
+        limit = self.get_query_limit(
+            'limit', SIMILAR_RECIPES_LIMIT, MAX_SIMILAR_RECIPES_LIMIT
+        )
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise exceptions.NotFound()
+        ids = similarity_index.similar(recipe_id, limit)
+        if ids is None:
+            get_object_or_404(Recipe.objects.only('id'), pk=pk)
+            ids = []
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[id] for id in ids if id in recipes], many=True
+        )
+        return Response(serializer.data)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in (
+            'list',
+            'retrieve',
+            'bundle',
+            'recommended',
+            'similar',
+        ):
+            context['fields'] = self.get_sparse_fields()
+        return context
+
     @action(
         detail=True,
         methods=(
@@ -212,57 +467,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False,
         methods=('get',),
         permission_classes=(permissions.IsAuthenticated,),
+        throttle_scope='exports',
     )
     def download_shopping_cart(self, request):
         user = request.user
 
-        total_ingredients = (
-            RecipeIngredient.objects.filter(recipe__shopping__user=user)
-            .values('ingredients__name', 'ingredients__measurement_unit')
-            .annotate(total_amount=Sum('amount'))
-        )
+        shopping_list = get_shopping_list(user)
 
         response = HttpResponse(content_type=RESPONSE_CONTENT_TYPE)
         response[
             'Content-Disposition'
         ] = f"attachment; filename='{SHOPPING_CART_FILE_NAME}'"
 
-        font_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            'fonts/',
-            'Verdana.ttf',
-        )
-
-        p = canvas.Canvas(response)
-        pdfmetrics.registerFont(TTFont('Verdana', font_path))
-        p.setFont('Verdana', 15)
-
-        p.setFillColorRGB(0.2, 0.4, 0.6)
-        p.rect(0, 805, 600, 40, fill=True)
-
-        p.setFillColorRGB(1, 1, 1)
-        p.drawString(210, 820, 'Корзина покупок:')
-
-        y_position = 750
-
-        p.setFillColorRGB(0, 0, 0)
-        for ingredient_data in total_ingredients:
-            ingredient = (
-                f"{ingredient_data['ingredients__name']} "
-                f"({ingredient_data['ingredients__measurement_unit']})"
-            )
-            amount = ingredient_data['total_amount']
-            p.drawString(70, y_position, f'{ingredient} — {amount}')
-            y_position -= 15
-
-        p.setFillColorRGB(0.2, 0.4, 0.6)
-        p.rect(0, 55, 600, 40, fill=True)
+        # reportlab загружается только при скачивании списка покупок.
+        from api.pdf import draw_shopping_cart
 
-        p.setFillColorRGB(1, 1, 1)
-        p.drawString(100, 70, ".-~*´¨¯¨`*·~-. ® «Фудграм» .-~*´¨¯¨`*·~-.")
-
-        p.showPage()
-        p.save()
+        draw_shopping_cart(response, shopping_list)
 
         return response
 
@@ -275,6 +495,17 @@ class IngredientsViewSet(RetrieveListViewSet):
     pagination_class = None
     filter_backends = (CustomIngredientsSearchFilter,)
     search_fields = ('^name',)
+    throttle_scope = 'search'
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return self.queryset.values('id', 'name', 'measurement_unit')
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return LeanIngredientsSerializer
+        return super().get_serializer_class()
 
 
 class ShoppingViewSet(viewsets.ModelViewSet):
@@ -287,8 +518,22 @@ class ShoppingViewSet(viewsets.ModelViewSet):
 class UserCreateViewSet(UserViewSet):
     '''Представление для юзеров и подписки.'''
 
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('id')
     serializer_class = CreateUserSerializer
+    pagination_class = LimitPageNumberOrCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            user = self.request.user
+            if user.is_authenticated:
+                is_subscribed = Exists(
+                    Follow.objects.filter(user=user, following=OuterRef('pk'))
+                )
+            else:
+                is_subscribed = Value(False, output_field=BooleanField())
+            queryset = queryset.annotate(is_subscribed=is_subscribed)
+        return queryset
 
     def get_permissions(self):
         if self.action == 'retrieve' and self.kwargs.get('id'):
@@ -347,17 +592,98 @@ class UserCreateViewSet(UserViewSet):
 class UserFollowViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     '''Представление для отображения списка подписок.'''
 
-    serializer_class = UserGetSerializer
+    serializer_class = LeanSubscriptionsSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
         current_user = self.request.user
+        fields = self.get_sparse_fields()
         following_list = Follow.objects.filter(user=current_user).values_list(
             'following'
         )
-        followed_users = User.objects.filter(id__in=following_list)
+        annotations = {
+            'recipes_count': Count('recipes'),
+            'is_subscribed': Exists(
+                Follow.objects.filter(
+                    user=current_user, following=OuterRef('pk')
+                )
+            ),
+        }
+        followed_users = (
+            User.objects.filter(id__in=following_list)
+            .only('id', *[name for name in USER_COLUMNS if name in fields])
+            .annotate(
+                **{
+                    name: annotation
+                    for name, annotation in annotations.items()
+                    if name in fields
+                }
+            )
+        )
+        if 'recipes' in fields:
+            followed_users = followed_users.prefetch_related(
+                Prefetch(
+                    'recipes',
+                    queryset=Recipe.objects.only(
+                        'id', 'author', 'name', 'image', 'cooking_time'
+                    ),
+                    to_attr='prefetched_recipes',
+                )
+            )
 
         recipes = Recipe.objects.filter(author__in=followed_users)
 
         self.request.followed_users_and_recipes = {'recipes': recipes}
         return followed_users
+
+    def get_sparse_fields(self):
+        return get_sparse_fields(
+            self.request, LeanSubscriptionsSerializer.field_names
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_sparse_fields()
+        return context
+
+
+class FirstRendererNegotiation(negotiation.DefaultContentNegotiation):
+    '''Не отвечает 406 на Accept: text/csv и подобные.'''
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ExportView(views.APIView):
+    '''
+    Потоковая выгрузка данных для персонала.
+
+    Параметры: output=csv|jsonl, gzip=true для сжатия на лету.
+    '''
+
+    permission_classes = (permissions.IsAdminUser,)
+    content_negotiation_class = FirstRendererNegotiation
+    throttle_scope = 'exports'
+
+    def get(self, request, name):
+        if name not in EXPORTS:
+            raise exceptions.NotFound(f'Неизвестная выгрузка: {name}.')
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            raise exceptions.ValidationError(
+                {'output': f'Допустимые форматы: {", ".join(EXPORT_FORMATS)}.'}
+            )
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        filename = f'{name}.{output}'
+        if compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        else:
+            content_type = EXPORT_CONTENT_TYPES[output]
+        response = StreamingHttpResponse(
+            iter_export(name, output, compress), content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        # nginx отдаёт поток клиенту сразу, не буферизуя его целиком.
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from rest_framework.permissions import SAFE_METHODS
+
+from backend.routers import use_replica
+
+STICKY_COOKIE_NAME = 'db_primary'
+
+
+class ReplicaRoutingMiddleware:
+    '''
+    Отправляет чтения безопасных запросов в реплики.
+
+    После записи клиент на REPLICA_STICKY_SECONDS читает из основной
+    БД, чтобы видеть свои изменения, пока реплика догоняет. Клиент
+    помечается cookie: её проверяет любой воркер без общего
+    состояния. Клиент, который не возвращает cookie, читает
+    из реплики сразу после записи.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            response.set_cookie(
+                STICKY_COOKIE_NAME,
+                '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+            return response
+        token = use_replica.set(STICKY_COOKIE_NAME not in request.COOKIES)
+        try:
+            return self.get_response(request)
+        finally:
+            use_replica.reset(token)
+
+
+class SkipForAPIMixin:
+    '''
+    Не выполняет middleware для путей LEAN_MIDDLEWARE_PATHS.
+
+    API аутентифицируется токенами DRF, сессия и сообщения ему не нужны;
+    админка и остальные пути проходят полный стек. Классы наследуют
+    исходные middleware, поэтому проверки админки их находят.
+    '''
+
+    def __call__(self, request):
+        if request.path_info.startswith(settings.LEAN_MIDDLEWARE_PATHS):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(
+    SkipForAPIMixin, sessions_middleware.SessionMiddleware
+):
+    pass
+
+
+class AuthenticationMiddleware(
+    SkipForAPIMixin, auth_middleware.AuthenticationMiddleware
+):
+    pass
+
+
+class MessageMiddleware(
+    SkipForAPIMixin, messages_middleware.MessageMiddleware
+):
+    pass
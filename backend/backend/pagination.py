@@ -1,5 +1,66 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from rest_framework import pagination
 
 
 class LimitPageNumberPagination(pagination.PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class EstimatedCountPaginator(Paginator):
+    '''
+    Пагинатор админки для больших таблиц.
+
+    Для нефильтрованного списка в PostgreSQL берёт оценку числа строк
+    из статистики планировщика вместо COUNT(*) по всей таблице.
+    '''
+
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT reltuples FROM pg_class WHERE relname = %s',
+                        (queryset.model._meta.db_table,),
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] > self.estimate_threshold:
+                    return int(row[0])
+        return super().count
+
+
+class IdCursorPagination(pagination.CursorPagination):
+    ordering = 'id'
+    page_size_query_param = 'limit'
+
+
+class LimitPageNumberOrCursorPagination(LimitPageNumberPagination):
+    '''
+    Постраничная пагинация; если в запросе есть параметр cursor
+    (пустой для первой страницы), то keyset-пагинация по id без COUNT
+    и OFFSET.
+    '''
+
+    cursor_pagination_class = IdCursorPagination
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,28 @@
+from django.contrib.auth.password_validation import (
+    get_default_password_validators,
+)
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+
+
+def preload():
+    '''
+    Готовит общее состояние в мастер-процессе до fork воркеров.
+
+    Загружает URLconf с представлениями, шрифты PDF, валидаторы паролей
+    со списком распространённых паролей и каталог тэгов,
+    чтобы воркеры получили их готовыми через copy-on-write. Соединения
+    с БД закрываются, чтобы воркеры не делили один сокет.
+    '''
+    from api.pdf import register_fonts
+    from food.catalogue import get_tags_catalogue
+
+    get_resolver().url_patterns
+    register_fonts()
+    get_default_password_validators()
+    try:
+        get_tags_catalogue()
+    except DatabaseError:
+        pass
+    finally:
+        connections.close_all()
@@ -0,0 +1,334 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import traceback
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404
+from django.shortcuts import render
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+PROFILE_ID_RE = re.compile(r'\d+-[0-9a-f]{8}')
+# Сколько функций cProfile и запросов попадает в сохранённый профиль.
+MAX_PROFILE_FUNCTIONS = 80
+MAX_PROFILE_QUERIES = 500
+MAX_ORIGIN_FRAMES = 3
+PROJECT_ROOT = str(settings.BASE_DIR) + os.sep
+SITE_PACKAGES = f'site-packages{os.sep}'
+DJANGO_DB = os.path.join('django', 'db', '')
+# Middleware проекта, через которые проходит любой запрос: их кадры
+# не указывают, откуда выполнен SQL.
+MIDDLEWARE_FILES = tuple(
+    os.path.join('backend', name)
+    for name in ('middleware.py', 'profiling.py', 'slow_queries.py')
+)
+
+# Профилировщик в процессе один: два одновременных cProfile в разных
+# потоках мешают друг другу.
+profiling_lock = threading.Lock()
+
+
+def get_staff_user(request):
+    '''
+    Сотрудник, отправивший запрос, или None.
+
+    Пользователь сессии (админка) уже есть в request.user; токены API
+    проверяются аутентификаторами DRF - только для запросов с флагом
+    профилирования, поэтому обычные запросы не платят за лишний поиск.
+    '''
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        user = None
+        for (
+            authentication_class
+        ) in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            try:
+                result = authentication_class().authenticate(request)
+            except APIException:
+                return None
+            if result is not None:
+                user = result[0]
+                break
+    if user is not None and user.is_active and user.is_staff:
+        return user
+    return None
+
+
+def format_frame(frame):
+    filename = frame.filename
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    else:
+        filename = filename.rpartition(SITE_PACKAGES)[2]
+    return f'{filename}:{frame.lineno} {frame.name}'
+
+
+def is_project_frame(frame):
+    return (
+        frame.filename.startswith(PROJECT_ROOT)
+        and SITE_PACKAGES not in frame.filename
+        and not frame.filename.endswith(MIDDLEWARE_FILES)
+    )
+
+
+def get_caller(stack):
+    '''Ближний к запросу кадр кода проекта или None.'''
+    for frame in reversed(stack):
+        if is_project_frame(frame):
+            return format_frame(frame)
+    return None
+
+
+def get_origin(stack):
+    '''
+    Откуда выполнен запрос, от ближнего кадра: место вне ORM (часто
+    DRF, который вычисляет queryset представления) и до
+    MAX_ORIGIN_FRAMES кадров кода проекта.
+    '''
+    frames = []
+    for frame in reversed(stack):
+        # Обёртки execute_wrapper профилировщика и журнала медленных
+        # запросов стоят между ORM и вызывающим кодом.
+        if DJANGO_DB in frame.filename or frame.filename.endswith(
+            MIDDLEWARE_FILES
+        ):
+            continue
+        if not frames or is_project_frame(frame):
+            frames.append(format_frame(frame))
+            if len(frames) > MAX_ORIGIN_FRAMES:
+                break
+    return frames
+
+
+class QueryCollector:
+    '''
+    Обёртка connection.execute_wrapper: SQL, время и место вызова.
+
+    Параметры запросов не сохраняются - в профиль не попадают пароли
+    и личные данные.
+    '''
+
+    def __init__(self):
+        self.queries = []
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.duration += duration
+            if len(self.queries) < MAX_PROFILE_QUERIES:
+                self.queries.append(
+                    {
+                        'alias': context['connection'].alias,
+                        'sql': sql,
+                        'many': many,
+                        'duration': round(duration, 3),
+                        'origin': get_origin(traceback.extract_stack()),
+                    }
+                )
+
+
+class Profiler:
+    '''pyinstrument (семплирующий), если установлен, иначе cProfile.'''
+
+    def __init__(self):
+        if pyinstrument is not None:
+            self.kind = 'pyinstrument'
+            self.profiler = pyinstrument.Profiler(async_mode='disabled')
+        else:
+            self.kind = 'cProfile'
+            self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        if pyinstrument is not None:
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if pyinstrument is not None:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def get_report(self):
+        if pyinstrument is not None:
+            return self.profiler.output_text(unicode=True, color=False)
+        output = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=output)
+        stats.sort_stats('cumulative').print_stats(MAX_PROFILE_FUNCTIONS)
+        return output.getvalue()
+
+
+class ProfileRing:
+    '''
+    Последние PROFILES_LIMIT профилей в каталоге PROFILES_PATH.
+
+    Профиль - JSON-файл с именем "время-случайный суффикс", поэтому
+    сортировка имён идёт по времени; после записи старые файлы
+    сверх лимита удаляются.
+    '''
+
+    def __init__(self, path, limit):
+        self.path = path
+        self.limit = limit
+
+    def get_path(self, profile_id):
+        return os.path.join(self.path, f'{profile_id}.json')
+
+    def list_ids(self):
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            (name[:-5] for name in names if name.endswith('.json')),
+            reverse=True,
+        )
+
+    def save(self, profile):
+        os.makedirs(self.path, exist_ok=True)
+        profile_id = f'{time.time_ns()}-{uuid.uuid4().hex[:8]}'
+        path = self.get_path(profile_id)
+        with open(f'{path}.tmp', 'w') as output:
+            json.dump(profile, output, ensure_ascii=False)
+        os.replace(f'{path}.tmp', path)
+        limit = self.limit
+        for stale in self.list_ids()[limit:]:
+            try:
+                os.remove(self.get_path(stale))
+            except FileNotFoundError:
+                # Удалён параллельным воркером.
+                pass
+        return profile_id
+
+    def load(self, profile_id):
+        if not PROFILE_ID_RE.fullmatch(profile_id):
+            return None
+        try:
+            with open(self.get_path(profile_id)) as profile:
+                return json.load(profile)
+        except FileNotFoundError:
+            return None
+
+
+profile_ring = ProfileRing(settings.PROFILES_PATH, settings.PROFILES_LIMIT)
+
+
+class ProfilerMiddleware:
+    '''
+    Профилирует запрос сотрудника по заголовку X-Profile или ?profile.
+
+    Запрос без флага проходит дальше без дополнительной работы. Флаг
+    от остальных пользователей молча игнорируется. Профиль (отчёт
+    профилировщика и SQL с временем и местом вызова) сохраняется
+    в profile_ring, его id возвращается в заголовке X-Profile-Id,
+    а сам профиль открывается в админке: /admin/profiles/.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PROFILE_HEADER not in request.META and (
+            PROFILE_PARAM not in request.GET
+        ):
+            return self.get_response(request)
+        user = get_staff_user(request)
+        if user is None or not profiling_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.profile(request, user)
+        finally:
+            profiling_lock.release()
+
+    def profile(self, request, user):
+        collector = QueryCollector()
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            with Profiler() as profiler:
+                response = self.get_response(request)
+        duration = (time.perf_counter() - started) * 1000
+        profile_id = profile_ring.save(
+            {
+                'started': started_at.isoformat(),
+                'method': request.method,
+                'path': request.get_full_path(),
+                'user': user.get_username(),
+                'status': response.status_code,
+                'duration': round(duration, 1),
+                'profiler': profiler.kind,
+                'query_count': collector.count,
+                'query_duration': round(collector.duration, 1),
+                'queries': collector.queries,
+                'report': profiler.get_report(),
+            }
+        )
+        response[PROFILE_ID_HEADER] = profile_id
+        return response
+
+
+def profile_list_view(request):
+    profiles = []
+    for profile_id in profile_ring.list_ids():
+        profile = profile_ring.load(profile_id)
+        if profile is not None:
+            profile.pop('queries')
+            profile.pop('report')
+            profiles.append({'id': profile_id, **profile})
+    return render(
+        request,
+        'admin/profiles/list.html',
+        {
+            **admin.site.each_context(request),
+            'title': 'Профили запросов',
+            'profiles': profiles,
+        },
+    )
+
+
+def profile_detail_view(request, profile_id):
+    profile = profile_ring.load(profile_id)
+    if profile is None:
+        raise Http404
+    return render(
+        request,
+        'admin/profiles/detail.html',
+        {
+            **admin.site.each_context(request),
+            'title': f'{profile["method"]} {profile["path"]}',
+            'profile_id': profile_id,
+            'profile': profile,
+        },
+    )
@@ -0,0 +1,36 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Выставляется ReplicaRoutingMiddleware на время безопасного запроса.
+use_replica = ContextVar('use_replica', default=False)
+
+
+class ReplicaRouter:
+    '''
+    Чтение из реплик DATABASE_REPLICAS, запись в основную БД.
+
+    Реплика выбирается только внутри запроса, отмеченного
+    ReplicaRoutingMiddleware, и только вне транзакции: команды,
+    миграции и код в atomic() читают из основной БД.
+    '''
+
+    def db_for_read(self, model, **hints):
+        if (
+            settings.DATABASE_REPLICAS
+            and use_replica.get()
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
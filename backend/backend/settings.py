@@ -32,21 +32,28 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'backend.middleware.ReplicaRoutingMiddleware',
+    'backend.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'backend.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'backend.middleware.AuthenticationMiddleware',
+    'backend.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.profiling.ProfilerMiddleware',
 ]
 
+# Пути, для которых SessionMiddleware, AuthenticationMiddleware
+# и MessageMiddleware не выполняются: API работает по токенам.
+LEAN_MIDDLEWARE_PATHS = ('/api/',)
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -61,6 +68,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Прогрев общего состояния до fork воркеров (gunicorn --preload).
+PRELOAD_APP = config('PRELOAD_APP', default=False, cast=bool)
+
 
 DATABASES = {
     'default': {
@@ -73,6 +83,25 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS=replica1,replica2:5433.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1
+):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+
+# Сколько секунд после записи клиент читает из основной БД.
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -106,6 +135,7 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+DEFAULT_FILE_STORAGE = 'backend.storage.ContentAddressedStorage'
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -125,6 +155,46 @@ MAX_AMOUNT_COUNT = 5000
 
 SHOPPING_CART_FILE_NAME = 'shopping_cart.pdf'
 
+BUNDLE_RECIPES_LIMIT = 6
+MAX_BUNDLE_RECIPES_LIMIT = 30
+
+# Файл соседей рецептов, который строит manage.py build_recommendations.
+RECOMMENDATIONS_PATH = config(
+    'RECOMMENDATIONS_PATH',
+    default=os.path.join(BASE_DIR, 'data', 'recommendations.npy'),
+)
+RECOMMENDATIONS_LIMIT = 12
+MAX_RECOMMENDATIONS_LIMIT = 60
+# Сколько последних избранных и покупок учитывается в рекомендациях.
+RECOMMENDATIONS_HISTORY = 100
+
+# Каталог индекса похожих рецептов (manage.py build_similarity).
+SIMILARITY_INDEX_PATH = config(
+    'SIMILARITY_INDEX_PATH',
+    default=os.path.join(BASE_DIR, 'data', 'similarity'),
+)
+SIMILAR_RECIPES_LIMIT = 6
+MAX_SIMILAR_RECIPES_LIMIT = 30
+
+# Профилирование запросов сотрудников по заголовку X-Profile.
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=True, cast=bool)
+PROFILES_PATH = config(
+    'PROFILES_PATH', default=os.path.join(BASE_DIR, 'data', 'profiles')
+)
+PROFILES_LIMIT = 50
+
+# Запросы к БД дольше порога, мс, пишутся в журнал с EXPLAIN;
+# 0 отключает журнал. Отчёт: manage.py slow_query_report.
+SLOW_QUERY_THRESHOLD = config('SLOW_QUERY_THRESHOLD', default=200, cast=int)
+SLOW_QUERY_LOG_PATH = config(
+    'SLOW_QUERY_LOG_PATH',
+    default=os.path.join(BASE_DIR, 'data', 'slow_queries.jsonl'),
+)
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+
+
+# Отключение лимитов частоты запросов, например для нагрузочных тестов.
+API_THROTTLING = config('API_THROTTLING', default=True, cast=bool)
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -137,6 +207,30 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'backend.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'backend.throttling.TokenBucketThrottle',
+        'backend.throttling.WriteThrottle',
+        'backend.throttling.AnonFeedThrottle',
+    ]
+    if API_THROTTLING
+    else [],
+    'DEFAULT_THROTTLE_RATES': {
+        'exports': '30/hour',
+        'writes': '120/min',
+        'search': '120/min',
+        'anon_feed': '120/min',
+    },
+    # Адрес клиента берётся из X-Forwarded-For, который дописывает nginx.
+    'NUM_PROXIES': config('NUM_PROXIES', default=1, cast=int),
     'DEFAULT_PAGINATION_CLASS': 'backend.pagination.LimitPageNumberPagination',
     'PAGE_SIZE': 6,
 }
@@ -151,6 +245,7 @@ SIMPLE_JWT = {
 DJOSER = {
     'HIDE_USERS': False,
     'SERIALIZERS': {
+        'user_create': 'api.serializers.UserRegistrationSerializer',
         'user': 'api.serializers.CreateUserSerializer',
         'current_user': 'api.serializers.CreateUserSerializer',
     },
@@ -0,0 +1,317 @@
+import datetime
+import decimal
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from backend.profiling import get_caller, get_origin
+
+logger = logging.getLogger(__name__)
+
+# Ожидающие EXPLAIN и записи в журнал; при переполнении записи
+# отбрасываются, а не тормозят запросы.
+QUEUE_SIZE = 1000
+# План каждого отпечатка снимается процессом один раз.
+MAX_EXPLAINED = 10_000
+MAX_SAFE_PARAMS = 20
+# Сколько представлений и мест вызова отпечатка показывает отчёт.
+REPORT_TOP = 3
+SAFE_PARAM_TYPES = (
+    bool,
+    int,
+    float,
+    decimal.Decimal,
+    datetime.date,
+    datetime.time,
+    uuid.UUID,
+    type(None),
+)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_RE = re.compile(r'%s|\?')
+IN_LIST_RE = re.compile(r'\bIN \((?:\?, )*\?\)', re.I)
+VALUES_RE = re.compile(r'\bVALUES \(.*\)', re.I | re.S)
+SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    '''
+    SQL без значений: литералы и плейсхолдеры заменяются на ?, списки
+    IN (...) и VALUES любой длины сворачиваются.
+    '''
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = PLACEHOLDER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = VALUES_RE.sub('VALUES (...)', sql)
+    return SPACES_RE.sub(' ', sql).strip()
+
+
+def get_fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def get_safe_params(params):
+    '''
+    Параметры, которые можно писать в журнал: числа, даты, bool.
+
+    Строки и байты могут содержать пароли, токены и личные данные
+    и заменяются на '?'; длинные списки обрезаются.
+    '''
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        params = list(params.values())
+    safe = [
+        param if isinstance(param, SAFE_PARAM_TYPES) else '?'
+        for param in list(params)[:MAX_SAFE_PARAMS]
+    ]
+    if len(params) > MAX_SAFE_PARAMS:
+        safe.append(f'... ещё {len(params) - MAX_SAFE_PARAMS}')
+    return safe
+
+
+def explain(alias, sql, params):
+    '''
+    План запроса без выполнения: EXPLAIN (ANALYZE false) в PostgreSQL,
+    EXPLAIN QUERY PLAN в SQLite. Выполняется в потоке SlowQueryLog
+    на отдельном соединении.
+    '''
+    connection = connections[alias]
+    options = {'analyze': False} if connection.vendor == 'postgresql' else {}
+    prefix = connection.ops.explain_query_prefix(**options)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        # В SQLite план - последний столбец строк EXPLAIN QUERY PLAN.
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+
+class SlowQueryLog:
+    '''
+    Журнал медленных запросов: JSON-строки в SLOW_QUERY_LOG_PATH.
+
+    Запрос дольше SLOW_QUERY_THRESHOLD мс ставится в очередь, а фоновый
+    поток процесса снимает для него EXPLAIN (для нового отпечатка
+    SELECT) и дописывает строку в журнал одним write - строки разных
+    воркеров не перемешиваются. Журнал больше SLOW_QUERY_LOG_MAX_BYTES
+    переименовывается в .1, отчёт читает оба файла.
+    '''
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.explained = set()
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def ensure_worker(self):
+        # Поток не переживает fork (gunicorn --preload): воркер
+        # запускает свой.
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                threading.Thread(
+                    target=self.run, name='slow-query-log', daemon=True
+                ).start()
+                self.pid = os.getpid()
+
+    def add(self, record, sql, params):
+        self.ensure_worker()
+        try:
+            self.queue.put_nowait((record, sql, params))
+        except queue.Full:
+            logger.warning('Очередь журнала медленных запросов переполнена.')
+
+    def run(self):
+        while True:
+            record, sql, params = self.queue.get()
+            try:
+                self.process(record, sql, params)
+            except Exception:
+                logger.exception('Не удалось записать медленный запрос.')
+            finally:
+                if self.queue.empty():
+                    connections.close_all()
+
+    def process(self, record, sql, params):
+        fingerprint = record['fingerprint']
+        if (
+            fingerprint not in self.explained
+            and not record['many']
+            and sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+        ):
+            if len(self.explained) >= MAX_EXPLAINED:
+                self.explained.clear()
+            self.explained.add(fingerprint)
+            try:
+                record['plan'] = explain(record['alias'], sql, params)
+            except Exception as error:
+                record['plan'] = f'EXPLAIN не выполнен: {error}'
+        logger.warning(
+            'Медленный запрос %s: %.1f мс, %s',
+            fingerprint,
+            record['duration'],
+            record['caller'] or record['view'],
+        )
+        self.write(record)
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            if os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, f'{self.path}.1')
+        except FileNotFoundError:
+            pass
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+    def read(self):
+        '''Записи журнала, начиная со старых.'''
+        for path in (f'{self.path}.1', self.path):
+            try:
+                with open(path, encoding='utf-8') as log:
+                    for line in log:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            # Строка, дописываемая прямо сейчас.
+                            continue
+            except FileNotFoundError:
+                continue
+
+
+slow_query_log = SlowQueryLog(
+    settings.SLOW_QUERY_LOG_PATH, settings.SLOW_QUERY_LOG_MAX_BYTES
+)
+
+
+class SlowQueryMiddleware:
+    '''
+    Замеряет каждый SQL-запрос запроса через connection.execute_wrapper
+    и отправляет дольше SLOW_QUERY_THRESHOLD мс в slow_query_log
+    с представлением и строкой кода, откуда он выполнен.
+
+    Быстрый запрос стоит двух вызовов perf_counter; стек, отпечаток
+    и параметры собираются только для медленных.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_THRESHOLD:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.SLOW_QUERY_THRESHOLD / 1000
+
+    def __call__(self, request):
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                duration = time.perf_counter() - started
+                if duration >= self.threshold:
+                    self.log(request, sql, params, many, context, duration)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(wrapper))
+            return self.get_response(request)
+
+    def log(self, request, sql, params, many, context, duration):
+        match = request.resolver_match
+        # Без кадров wrapper и log.
+        stack = traceback.extract_stack()[:-2]
+        normalized = normalize_sql(sql)
+        slow_query_log.add(
+            {
+                'time': datetime.datetime.now(datetime.timezone.utc),
+                'fingerprint': get_fingerprint(normalized),
+                'sql': normalized,
+                'duration': round(duration * 1000, 1),
+                'alias': context['connection'].alias,
+                'many': many,
+                'method': request.method,
+                'path': request.path,
+                'view': f'{match._func_path}:{match.url_name}'
+                if match
+                else None,
+                'caller': get_caller(stack),
+                'origin': get_origin(stack),
+                'params': None if many else get_safe_params(params),
+                'plan': None,
+            },
+            sql,
+            params,
+        )
+
+
+def aggregate(records):
+    '''
+    Сводка журнала по отпечаткам: число, суммарное, среднее, p95
+    и максимальное время, частые представления и места вызова,
+    параметры самого медленного запроса и последний снятый план.
+    '''
+    groups = {}
+    for record in records:
+        group = groups.setdefault(
+            record['fingerprint'],
+            {
+                'fingerprint': record['fingerprint'],
+                'sql': record['sql'],
+                'durations': [],
+                'views': Counter(),
+                'origins': Counter(),
+                'first_seen': record['time'],
+                'slowest': record,
+                'plan': None,
+            },
+        )
+        group['durations'].append(record['duration'])
+        group['views'][record['view'] or record['path']] += 1
+        # Записи до появления caller его не содержат.
+        caller = record.get('caller')
+        if caller:
+            group['origins'][caller] += 1
+        group['last_seen'] = record['time']
+        if record['duration'] > group['slowest']['duration']:
+            group['slowest'] = record
+        if record['plan']:
+            group['plan'] = record['plan']
+
+    report = []
+    for group in groups.values():
+        durations = sorted(group.pop('durations'))
+        slowest = group.pop('slowest')
+        report.append(
+            {
+                **group,
+                'count': len(durations),
+                'total': round(sum(durations), 1),
+                'mean': round(sum(durations) / len(durations), 1),
+                'p95': durations[int(0.95 * (len(durations) - 1))],
+                'max': durations[-1],
+                'views': group['views'].most_common(REPORT_TOP),
+                'origins': group['origins'].most_common(REPORT_TOP),
+                'params': slowest['params'],
+            }
+        )
+    return report
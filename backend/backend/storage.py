@@ -0,0 +1,57 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME_RE = re.compile(
+    r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:\.\w+)?$'
+)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    '''
+    Файловое хранилище с именами по содержимому.
+
+    Файл food/images/temp.png сохраняется как
+    food/images/ab/cd/abcd...ef.png, где abcd...ef - SHA-256
+    содержимого: каталоги делятся на 256 x 256 частей, одинаковые
+    загрузки хранятся один раз, а содержимое по адресу никогда
+    не меняется, поэтому nginx отдаёт его с Cache-Control: immutable.
+    '''
+
+    hash_chunk_size = 64 * 1024
+
+    def get_hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks(self.hash_chunk_size):
+            digest.update(chunk)
+        content.seek(0)
+        return self.get_sharded_name(name, digest.hexdigest())
+
+    def get_sharded_name(self, name, hexdigest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(
+            directory,
+            hexdigest[:2],
+            hexdigest[2:4],
+            f'{hexdigest}{extension}',
+        ).replace('\\', '/')
+
+    def is_hashed_name(self, name):
+        return bool(HASHED_NAME_RE.search(name))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            # Время изменения - последнее сохранение: по нему уборка
+            # не трогает файл, ссылка на который ещё не зафиксирована.
+            os.utime(self.path(name))
+            return name
+        return self._save(name, content)
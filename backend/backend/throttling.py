@@ -0,0 +1,84 @@
+from rest_framework import throttling
+from rest_framework.permissions import SAFE_METHODS
+
+MICROSECONDS = 1_000_000
+
+
+class TokenBucketThrottle(throttling.ScopedRateThrottle):
+    '''
+    Ограничение частоты запросов корзиной токенов (алгоритм GCRA).
+
+    Ставка вида 'N/период' из DEFAULT_THROTTLE_RATES даёт корзину
+    на N запросов, пополняемую по одному токену за период / N.
+    Состояние клиента - одно число в кеше (теоретическое время
+    прибытия следующего запроса), которое сдвигается атомарным
+    cache.incr, поэтому с общим кешем лимит соблюдается всеми
+    воркерами сразу. Запросов к БД нет: клиент определяется по уже
+    аутентифицированному пользователю или по IP.
+    '''
+
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+    wait_time = None
+
+    def get_scope(self, request, view):
+        return getattr(view, self.scope_attr, None)
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+
+        interval = self.duration * MICROSECONDS // self.num_requests
+        capacity = interval * self.num_requests
+        now = int(self.timer() * MICROSECONDS)
+        timeout = self.duration + 1
+        if self.cache.add(self.key, now + interval, timeout):
+            return True
+        try:
+            arrival = self.cache.incr(self.key, interval)
+        except ValueError:
+            # Ключ истёк между add и incr.
+            self.cache.set(self.key, now + interval, timeout)
+            return True
+        if arrival <= now + interval:
+            # Корзина была полной: отсчёт начинается заново.
+            self.cache.set(self.key, now + interval, timeout)
+            return True
+        if arrival - now > capacity:
+            self.cache.decr(self.key, interval)
+            self.cache.touch(self.key, timeout)
+            self.wait_time = (arrival - now - capacity) / MICROSECONDS
+            return False
+        if arrival - now > capacity // 2:
+            # incr не продлевает ключ: без этого у активного клиента
+            # корзина обнулялась бы по истечении timeout.
+            self.cache.touch(self.key, timeout)
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class WriteThrottle(TokenBucketThrottle):
+    '''Общий лимит на изменяющие запросы ко всему API.'''
+
+    def get_scope(self, request, view):
+        if request.method in SAFE_METHODS:
+            return None
+        return 'writes'
+
+
+class AnonFeedThrottle(TokenBucketThrottle):
+    '''Лимит на чтение анонимными клиентами представлений с лентой.'''
+
+    scope_attr = 'anon_throttle_scope'
+
+    def get_scope(self, request, view):
+        if request.user.is_authenticated or request.method not in SAFE_METHODS:
+            return None
+        return super().get_scope(request, view)
@@ -2,7 +2,19 @@ from django.contrib import admin
 from django.urls import include, path
 from rest_framework.authtoken import views
 
+from backend.profiling import profile_detail_view, profile_list_view
+
 urlpatterns = [
+    path(
+        'admin/profiles/',
+        admin.site.admin_view(profile_list_view),
+        name='profiles',
+    ),
+    path(
+        'admin/profiles/<str:profile_id>/',
+        admin.site.admin_view(profile_detail_view),
+        name='profile',
+    ),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('api-token-auth/', views.obtain_auth_token),
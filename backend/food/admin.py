@@ -1,5 +1,9 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
+from backend.pagination import EstimatedCountPaginator
 from food.models import (
     Favorite,
     Follow,
@@ -11,6 +15,44 @@ from food.models import (
 )
 
 
+class RecipeTagsFilter(admin.SimpleListFilter):
+    '''Фильтр по тэгу рецепта через EXISTS, без JOIN и DISTINCT.'''
+
+    title = 'Тэги'
+    parameter_name = 'tag'
+    recipe_field = 'pk'
+
+    def lookups(self, request, model_admin):
+        return Tag.objects.values_list('id', 'name')
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            tag_id = int(self.value())
+        except ValueError:
+            raise IncorrectLookupParameters(self.value())
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe_id=OuterRef(self.recipe_field),
+                    tag_id=tag_id,
+                )
+            )
+        )
+
+
+class RelatedRecipeTagsFilter(RecipeTagsFilter):
+    recipe_field = 'recipe_id'
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    '''Базовая админка для больших таблиц: без полного COUNT(*).'''
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'color', 'slug')
@@ -20,9 +62,9 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     list_display = ('name', 'measurement_unit')
-    search_fields = ('name',)
+    search_fields = ('^name',)
     list_filter = ('measurement_unit',)
     list_display_links = ('name',)
 
@@ -30,48 +72,81 @@ class IngredientAdmin(admin.ModelAdmin):
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
+    autocomplete_fields = ('ingredients',)
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'cooking_time')
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ('name', 'author', 'cooking_time', 'favorites_count')
     list_editable = ('cooking_time',)
-    search_fields = ('name', 'author__username', 'author__email')
-    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('^name', '=author__username', '=author__email')
+    list_filter = (RecipeTagsFilter,)
     list_display_links = ('name', 'author')
+    autocomplete_fields = ('author',)
     inlines = [RecipeIngredientInline]
 
+    def get_queryset(self, request):
+        favorites = (
+            Favorite.objects.filter(recipe=OuterRef('pk'))
+            .values('recipe')
+            .annotate(count=Count('*'))
+            .values('count')
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                favorites_count=Coalesce(
+                    Subquery(favorites, output_field=IntegerField()), 0
+                )
+            )
+        )
+
+    @admin.display(description='В избранном', ordering='favorites_count')
+    def favorites_count(self, obj):
+        return obj.favorites_count
+
 
 @admin.register(RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(LargeTableAdmin):
     list_display = ('recipe', 'ingredients', 'amount')
-    search_fields = ('recipe__name', 'ingredients__name')
-    list_filter = ('recipe', 'ingredients')
+    list_select_related = ('recipe', 'ingredients')
+    search_fields = ('^recipe__name', '^ingredients__name')
+    list_filter = ('ingredients__measurement_unit',)
+    raw_id_fields = ('recipe',)
+    autocomplete_fields = ('ingredients',)
 
 
 @admin.register(Shopping)
-class ShoppingAdmin(admin.ModelAdmin):
+class ShoppingAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
-    search_fields = ('user__username', 'user__email', 'recipe__name')
-    list_filter = ('recipe__tags',)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('=user__username', '=user__email', '^recipe__name')
+    list_filter = (RelatedRecipeTagsFilter,)
     list_display_links = ('user',)
+    raw_id_fields = ('user', 'recipe')
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
-    search_fields = ('user__username', 'user__email', 'recipe__name')
-    list_filter = ('recipe__tags',)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('=user__username', '=user__email', '^recipe__name')
+    list_filter = (RelatedRecipeTagsFilter,)
     list_display_links = ('user',)
+    raw_id_fields = ('user', 'recipe')
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('user', 'following')
+    list_select_related = ('user', 'following')
     search_fields = (
-        'user__username',
-        'user__email',
-        'following__username',
-        'following__email',
+        '=user__username',
+        '=user__email',
+        '=following__username',
+        '=following__email',
     )
     list_display_links = ('user', 'following')
+    raw_id_fields = ('user', 'following')
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save, pre_save
 
 
 class FoodConfig(AppConfig):
@@ -6,3 +7,20 @@ class FoodConfig(AppConfig):
     name = 'food'
 
     verbose_name = 'Рецепты'
+
+    def ready(self):
+        from food.catalogue import invalidate_tags_catalogue
+        from food.images import (
+            delete_recipe_image,
+            delete_replaced_recipe_image,
+            remember_recipe_image,
+        )
+
+        tag = self.get_model('Tag')
+        post_save.connect(invalidate_tags_catalogue, sender=tag)
+        post_delete.connect(invalidate_tags_catalogue, sender=tag)
+
+        recipe = self.get_model('Recipe')
+        pre_save.connect(remember_recipe_image, sender=recipe)
+        post_save.connect(delete_replaced_recipe_image, sender=recipe)
+        post_delete.connect(delete_recipe_image, sender=recipe)
@@ -0,0 +1,25 @@
+from django.core.cache import cache
+
+from food.models import Tag
+
+TAGS_CACHE_KEY = 'food:tags:catalogue'
+TAGS_CACHE_TIMEOUT = 60 * 60
+
+
+def get_tags_catalogue(slugs=()):
+    '''
+    Словарь slug -> id всех тэгов, закешированный между запросами.
+
+    Сигнал сбрасывает кеш только в процессе, сохранившем тэг, поэтому
+    при slug из slugs, которого нет в кеше, каталог перечитывается
+    из БД: новый тэг находится в любом воркере.
+    '''
+    catalogue = cache.get(TAGS_CACHE_KEY)
+    if catalogue is None or any(slug not in catalogue for slug in slugs):
+        catalogue = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(TAGS_CACHE_KEY, catalogue, TAGS_CACHE_TIMEOUT)
+    return catalogue
+
+
+def invalidate_tags_catalogue(**kwargs):
+    cache.delete(TAGS_CACHE_KEY)
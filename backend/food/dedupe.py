@@ -0,0 +1,375 @@
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import (
+    BigIntegerField,
+    Case,
+    Count,
+    F,
+    IntegerField,
+    Value,
+    When,
+)
+
+from backend.settings import MAX_AMOUNT_COUNT
+from food.models import Ingredient, RecipeIngredient
+from food.shopping import CANONICAL_INGREDIENTS, UNIT_CONVERSIONS
+
+# Размер хешированного пространства триграмм.
+TRIGRAM_DIMENSIONS = 4096
+# Строки блока сравниваются кусками, чтобы матрица сходства
+# оставалась небольшой и для крупных блоков.
+SIMILARITY_CHUNK = 1024
+BLOCK_PREFIX = 3
+# Короткие слова с одной правкой - чаще разные слова (сок и сом),
+# чем опечатка.
+MIN_TYPO_LENGTH = 4
+MERGE_BATCH_SIZE = 500
+
+# Точка и запятая между цифрами - десятичный разделитель ("2,5%"),
+# остальные знаки препинания заменяются пробелом.
+PUNCTUATION_RE = re.compile(r'(?<!\d)[.,]|[.,](?!\d)|[^\w%.,]+')
+DIGITS_RE = re.compile(r'\d+(?:\.\d+)?')
+
+
+def normalize_name(name):
+    '''
+    Название без регистра, ё, знаков препинания и лишних пробелов;
+    десятичная запятая заменяется точкой: "Молоко 2,5 %" -> "молоко 2.5%".
+    '''
+    name = ' '.join(PUNCTUATION_RE.sub(' ', name.lower()).split())
+    name = name.replace('ё', 'е').replace(' %', '%').replace(',', '.')
+    return CANONICAL_INGREDIENTS.get(name, name)
+
+
+def normalize_unit(unit):
+    '''(базовая единица, множитель): "кг." и "Кг" -> ("г", 1000).'''
+    unit = unit.lower().strip().rstrip('.')
+    return UNIT_CONVERSIONS.get(unit, (unit, 1))
+
+
+def is_typo(first, second):
+    '''Одна вставка, удаление, замена или перестановка соседних букв.'''
+    if len(first) > len(second):
+        first, second = second, first
+    if len(second) - len(first) > 1 or len(first) < MIN_TYPO_LENGTH:
+        return False
+    if len(first) < len(second):
+        index = next(
+            (i for i, (a, b) in enumerate(zip(first, second)) if a != b),
+            len(first),
+        )
+        skipped = index + 1
+        return first[index:] == second[skipped:]
+    differences = [i for i, (a, b) in enumerate(zip(first, second)) if a != b]
+    if len(differences) == 1:
+        return True
+    return (
+        len(differences) == 2
+        and differences[1] == differences[0] + 1
+        and first[differences[0]] == second[differences[1]]
+        and first[differences[1]] == second[differences[0]]
+    )
+
+
+def is_misspelling(first, second):
+    '''
+    Названия отличаются опечаткой в одном слове: "майонез"
+    и "майонезз", но не "сметана жирная" и "сметана нежирная".
+    '''
+    first, second = first.split(), second.split()
+    if len(first) != len(second):
+        return False
+    different = [(a, b) for a, b in zip(first, second) if a != b]
+    return len(different) == 1 and is_typo(*different[0])
+
+
+def get_trigram_vectors(names):
+    '''
+    Разреженные векторы триграмм названий: (строки, столбцы).
+
+    Триграммы хешируются в TRIGRAM_DIMENSIONS столбцов; редкие
+    коллизии только чуть завышают сходство.
+    '''
+    rows, columns = [], []
+    for row, name in enumerate(names):
+        padded = f' {name} '
+        trigrams = set(map(''.join, zip(padded, padded[1:], padded[2:])))
+        rows.extend([row] * len(trigrams))
+        columns.extend(
+            zlib.crc32(trigram.encode()) % TRIGRAM_DIMENSIONS
+            for trigram in trigrams
+        )
+    return np.array(rows, np.int64), np.array(columns, np.int64)
+
+
+def find_similar_pairs(names, threshold):
+    '''
+    Пары индексов названий, отличающихся опечаткой.
+
+    Сравниваются только названия одного блока (общие первые
+    BLOCK_PREFIX символов): внутри блока векторы триграмм собираются
+    в плотную матрицу, и кандидаты с косинусным сходством не ниже
+    threshold находятся одним умножением матриц. Кандидаты проверяются
+    is_misspelling; названия с разными числами ("молоко 2,5%"
+    и "молоко 3,2%") не сливаются.
+    '''
+    rows, columns = get_trigram_vectors(names)
+    row_starts = np.searchsorted(rows, np.arange(len(names) + 1))
+    digits = [tuple(DIGITS_RE.findall(name)) for name in names]
+    blocks = defaultdict(list)
+    for index, name in enumerate(names):
+        blocks[name[:BLOCK_PREFIX]].append(index)
+
+    pairs = []
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        members = np.array(members)
+        vectors = np.zeros((members.size, TRIGRAM_DIMENSIONS), np.float32)
+        for position, member in enumerate(members):
+            start, end = row_starts[member], row_starts[member + 1]
+            vectors[position, columns[start:end]] = 1
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        for start in range(0, members.size, SIMILARITY_CHUNK):
+            end = start + SIMILARITY_CHUNK
+            similarity = vectors[start:end] @ vectors.T
+            left, right = np.nonzero(similarity >= threshold)
+            left += start
+            upper = left < right
+            for first, second in zip(
+                members[left[upper]].tolist(), members[right[upper]].tolist()
+            ):
+                if digits[first] == digits[second] and is_misspelling(
+                    names[first], names[second]
+                ):
+                    pairs.append((first, second))
+    return pairs
+
+
+def find_duplicate_clusters(ingredients, threshold):
+    '''
+    Группы дублей каталога: [(целевой ингредиент, [(дубль, множитель)])].
+
+    ingredients - список (id, name, measurement_unit, число рецептов).
+    Совпадающие после normalize_name названия и пары из
+    find_similar_pairs объединяются в группы; внутри группы сливаются
+    только ингредиенты с переводимыми друг в друга единицами. Целевым
+    становится ингредиент в базовой единице, затем с уже чистым
+    названием, затем самый используемый.
+    '''
+    names = [normalize_name(name) for _, name, _, _ in ingredients]
+    parents = list(range(len(ingredients)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    def union(first, second):
+        first, second = find(first), find(second)
+        if first != second:
+            parents[max(first, second)] = min(first, second)
+
+    # Названия, совпадающие без пробелов, - дубли без проверки
+    # сходства: "картофель фри" и "картофельфри", но не "молоко 1 5%"
+    # и "молоко 15%".
+    first_by_name = {}
+    for index, name in enumerate(names):
+        key = name.replace(' ', ''), tuple(DIGITS_RE.findall(name))
+        union(first_by_name.setdefault(key, index), index)
+    for first, second in find_similar_pairs(names, threshold):
+        union(first, second)
+
+    groups = defaultdict(list)
+    for index, (_, _, unit, _) in enumerate(ingredients):
+        base_unit, factor = normalize_unit(unit)
+        groups[find(index), base_unit].append((index, factor))
+
+    clusters = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        target, target_factor = min(
+            members,
+            key=lambda member: (
+                member[1],
+                ingredients[member[0]][1] != names[member[0]],
+                -ingredients[member[0]][3],
+                ingredients[member[0]][0],
+            ),
+        )
+        clusters.append(
+            (
+                ingredients[target][0],
+                [
+                    (ingredients[index][0], factor // target_factor)
+                    for index, factor in members
+                    if index != target
+                ],
+            )
+        )
+    return clusters
+
+
+def get_catalogue():
+    '''Ингредиенты каталога с числом рецептов, одним запросом.'''
+    return list(
+        Ingredient.objects.annotate(uses=Count('ingredients'))
+        .order_by('id')
+        .values_list('id', 'name', 'measurement_unit', 'uses')
+    )
+
+
+def get_mapping(clusters):
+    '''{дубль: (целевой ингредиент, множитель)}.'''
+    return {
+        source: (target, factor)
+        for target, sources in clusters
+        for source, factor in sources
+    }
+
+
+def iter_merged_rows(mapping):
+    '''
+    Строки рецептов с дублями и их целевыми ингредиентами после
+    слияния: (id строки, рецепт, дубль или цель, цель, количество
+    в единицах цели).
+    '''
+    targets = {target for target, _ in mapping.values()}
+    for row_id, recipe_id, ingredient_id, amount in (
+        RecipeIngredient.objects.filter(
+            ingredients_id__in=list(mapping) + list(targets)
+        )
+        .filter(
+            recipe_id__in=RecipeIngredient.objects.filter(
+                ingredients_id__in=list(mapping)
+            ).values('recipe_id')
+        )
+        .order_by('id')
+        .values_list('id', 'recipe_id', 'ingredients_id', 'amount')
+        .iterator()
+    ):
+        target, factor = mapping.get(ingredient_id, (ingredient_id, 1))
+        yield row_id, recipe_id, ingredient_id, target, amount * factor
+
+
+def exclude_overflowing(clusters):
+    '''
+    Убирает дубли, после слияния которых количество в рецепте
+    превысит MAX_AMOUNT_COUNT - границу валидатора
+    RecipeIngredient.amount: и после перевода единиц, и после
+    сложения строк одного рецепта.
+    '''
+    totals = defaultdict(int)
+    members = defaultdict(set)
+    mapping = get_mapping(clusters)
+    for _, recipe_id, ingredient_id, target, amount in iter_merged_rows(
+        mapping
+    ):
+        totals[recipe_id, target] += amount
+        if ingredient_id in mapping:
+            members[recipe_id, target].add(ingredient_id)
+    overflowing = set()
+    for key, total in totals.items():
+        if total > MAX_AMOUNT_COUNT:
+            overflowing |= members[key]
+    result = []
+    for target, sources in clusters:
+        sources = [
+            (source, factor)
+            for source, factor in sources
+            if source not in overflowing
+        ]
+        if sources:
+            result.append((target, sources))
+    return result, overflowing
+
+
+@transaction.atomic
+def merge_ingredients(clusters):
+    '''
+    Сливает дубли в целевые ингредиенты запросами к множествам строк.
+
+    1. Рецепты, где после слияния один ингредиент встретился бы
+       дважды, получают одну строку с суммой количеств, остальные
+       строки удаляются пачкой.
+    2. Остальные строки переносятся одним UPDATE на пачку дублей:
+       ingredients_id и amount через CASE.
+    3. Дубли удаляются из каталога.
+    Возвращает (перенесено строк, объединено строк, удалено
+    ингредиентов).
+    '''
+    mapping = get_mapping(clusters)
+    merged = resolve_conflicts(mapping)
+    moved = 0
+    sources = list(mapping)
+    for start in range(0, len(sources), MERGE_BATCH_SIZE):
+        end = start + MERGE_BATCH_SIZE
+        batch = sources[start:end]
+        scaled = [source for source in batch if mapping[source][1] != 1]
+        moved += RecipeIngredient.objects.filter(
+            ingredients_id__in=batch
+        ).update(
+            ingredients_id=Case(
+                *(
+                    When(ingredients_id=source, then=Value(mapping[source][0]))
+                    for source in batch
+                ),
+                output_field=BigIntegerField(),
+            ),
+            amount=Case(
+                *(
+                    When(
+                        ingredients_id=source,
+                        then=F('amount') * mapping[source][1],
+                    )
+                    for source in scaled
+                ),
+                default=F('amount'),
+                output_field=IntegerField(),
+            ),
+        )
+    _, deleted = Ingredient.objects.filter(id__in=sources).delete()
+    return moved, merged, deleted.get(Ingredient._meta.label, 0)
+
+
+def resolve_conflicts(mapping):
+    '''
+    Схлопывает строки одного рецепта, которые после слияния укажут
+    на один ингредиент; возвращает число удалённых строк. Суммы
+    уже проверены exclude_overflowing.
+    '''
+    rows = defaultdict(list)
+    for row_id, recipe_id, _, target, amount in iter_merged_rows(mapping):
+        rows[recipe_id, target].append((row_id, amount))
+
+    kept, removed = [], []
+    for (_, target), group in rows.items():
+        if len(group) < 2:
+            continue
+        amount = sum(amount for _, amount in group)
+        if amount > MAX_AMOUNT_COUNT:
+            # Каталог изменился после exclude_overflowing: слияние
+            # откатывается, а не обрезает количество.
+            raise ValueError(
+                f'Количество {amount} ингредиента {target} больше '
+                f'{MAX_AMOUNT_COUNT}.'
+            )
+        kept.append(
+            RecipeIngredient(
+                id=group[0][0], ingredients_id=target, amount=amount
+            )
+        )
+        removed.extend(row_id for row_id, _ in group[1:])
+    RecipeIngredient.objects.bulk_update(
+        kept, ('ingredients', 'amount'), batch_size=MERGE_BATCH_SIZE
+    )
+    for start in range(0, len(removed), MERGE_BATCH_SIZE):
+        end = start + MERGE_BATCH_SIZE
+        RecipeIngredient.objects.filter(id__in=removed[start:end]).delete()
+    return len(removed)
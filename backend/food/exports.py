@@ -0,0 +1,178 @@
+import csv
+import json
+import zlib
+
+from food.models import Favorite, Follow, Recipe, RecipeIngredient, Shopping
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 64 * 1024
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+RECIPE_FIELDS = (
+    'id',
+    'author_id',
+    'author__username',
+    'name',
+    'image',
+    'text',
+    'cooking_time',
+    'ingredients',
+)
+ACTIVITY_FIELDS = (
+    'id',
+    'user_id',
+    'user__username',
+    'recipe_id',
+    'recipe__name',
+)
+FOLLOW_FIELDS = (
+    'id',
+    'user_id',
+    'user__username',
+    'following_id',
+    'following__username',
+)
+
+
+class Echo:
+    '''Псевдофайл для csv.writer: writerow возвращает готовую строку.'''
+
+    def write(self, value):
+        return value
+
+
+def iter_recipes(chunk_size=EXPORT_CHUNK_SIZE):
+    '''
+    Рецепты с ингредиентами.
+
+    Рецепты и их ингредиенты читаются двумя курсорами, упорядоченными
+    по id рецепта, и сливаются на лету, поэтому память не зависит
+    от числа строк.
+    '''
+    recipes = (
+        Recipe.objects.order_by('id')
+        .values_list(*RECIPE_FIELDS[:-1])
+        .iterator(chunk_size=chunk_size)
+    )
+    items = (
+        RecipeIngredient.objects.order_by('recipe_id', 'ingredients_id')
+        .values_list(
+            'recipe_id',
+            'ingredients_id',
+            'ingredients__name',
+            'ingredients__measurement_unit',
+            'amount',
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    item = next(items, None)
+    for recipe in recipes:
+        recipe_id = recipe[0]
+        ingredients = []
+        while item is not None and item[0] <= recipe_id:
+            if item[0] == recipe_id:
+                ingredients.append(
+                    {
+                        'id': item[1],
+                        'name': item[2],
+                        'measurement_unit': item[3],
+                        'amount': item[4],
+                    }
+                )
+            item = next(items, None)
+        yield dict(zip(RECIPE_FIELDS, recipe + (ingredients,)))
+
+
+def iter_values(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    for row in (
+        queryset.order_by('id')
+        .values_list(*fields)
+        .iterator(chunk_size=chunk_size)
+    ):
+        yield dict(zip(fields, row))
+
+
+def iter_favorites(chunk_size=EXPORT_CHUNK_SIZE):
+    return iter_values(Favorite.objects, ACTIVITY_FIELDS, chunk_size)
+
+
+def iter_shopping(chunk_size=EXPORT_CHUNK_SIZE):
+    return iter_values(Shopping.objects, ACTIVITY_FIELDS, chunk_size)
+
+
+def iter_follows(chunk_size=EXPORT_CHUNK_SIZE):
+    return iter_values(Follow.objects, FOLLOW_FIELDS, chunk_size)
+
+
+EXPORTS = {
+    'recipes': (iter_recipes, RECIPE_FIELDS),
+    'favorites': (iter_favorites, ACTIVITY_FIELDS),
+    'shopping': (iter_shopping, ACTIVITY_FIELDS),
+    'follows': (iter_follows, FOLLOW_FIELDS),
+}
+
+
+def dump_json(value):
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, ensure_ascii=False)
+
+
+def iter_csv(rows, fields):
+    '''Строки CSV; вложенные списки записываются в ячейку как JSON.'''
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(
+            [
+                dump_json(value) if isinstance(value, list) else value
+                for value in row.values()
+            ]
+        )
+
+
+def iter_jsonl(rows):
+    for row in rows:
+        yield dump_json(row) + '\n'
+
+
+def iter_chunks(lines, buffer_size=EXPORT_BUFFER_SIZE):
+    '''Склеивает строки в блоки байт около buffer_size.'''
+    buffer = []
+    size = 0
+    for line in lines:
+        line = line.encode()
+        buffer.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks):
+    '''Сжимает поток блоков в gzip, не накапливая его в памяти.'''
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_export(
+    name, format='csv', compress=False, chunk_size=EXPORT_CHUNK_SIZE
+):
+    '''Блоки байт выгрузки name в формате csv или jsonl.'''
+    iter_rows, fields = EXPORTS[name]
+    rows = iter_rows(chunk_size)
+    lines = iter_csv(rows, fields) if format == 'csv' else iter_jsonl(rows)
+    chunks = iter_chunks(lines)
+    return iter_gzip(chunks) if compress else chunks
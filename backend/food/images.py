@@ -0,0 +1,108 @@
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from food.models import Recipe
+
+RECIPE_IMAGE_MAX_SIZE = (1600, 1600)
+RECIPE_IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+# Файлы моложе этого не удаляются: транзакция, сохранившая рецепт
+# с той же картинкой, могла ещё не зафиксироваться.
+ORPHAN_MIN_AGE = 60 * 60
+
+
+def store_recipe_image(path):
+    '''
+    Проверяет картинку рецепта и сохраняет её в хранилище.
+
+    Слишком большие картинки уменьшаются до RECIPE_IMAGE_MAX_SIZE,
+    остальные сохраняются без перекодирования. Возвращает имя файла
+    в хранилище; ошибки чтения и неподдерживаемые форматы дают
+    ValueError.
+    '''
+    with open(path, 'rb') as image_file:
+        content = image_file.read()
+    try:
+        image = Image.open(BytesIO(content))
+        image.load()
+    except (OSError, Image.DecompressionBombError) as error:
+        raise ValueError(f'{path}: не картинка ({error}).')
+    image_format = image.format
+    if image_format not in RECIPE_IMAGE_FORMATS:
+        raise ValueError(f'{path}: формат {image_format} не поддерживается.')
+    if (
+        image.width > RECIPE_IMAGE_MAX_SIZE[0]
+        or image.height > RECIPE_IMAGE_MAX_SIZE[1]
+    ):
+        image.thumbnail(RECIPE_IMAGE_MAX_SIZE)
+        output = BytesIO()
+        image.save(output, format=image_format, quality=85)
+        content = output.getvalue()
+    name = Recipe._meta.get_field('image').generate_filename(
+        None,
+        f'{os.path.splitext(os.path.basename(path))[0]}.'
+        f'{RECIPE_IMAGE_FORMATS[image_format]}',
+    )
+    return default_storage.save(name, ContentFile(content))
+
+
+def delete_unreferenced_images(names):
+    '''
+    Удаляет файлы, на которые не ссылается ни один рецепт.
+
+    После дедупликации один файл может принадлежать нескольким
+    рецептам, и другая транзакция может сохранять ссылку на него
+    прямо сейчас: такие файлы моложе ORPHAN_MIN_AGE остаются
+    сборщику collect_media.
+    '''
+    names = set(filter(None, names))
+    if not names:
+        return
+    names -= set(
+        Recipe.objects.filter(image__in=names).values_list('image', flat=True)
+    )
+    is_hashed_name = getattr(default_storage, 'is_hashed_name', None)
+    deadline = timezone.now() - timedelta(seconds=ORPHAN_MIN_AGE)
+    for name in names:
+        if is_hashed_name is not None and is_hashed_name(name):
+            try:
+                if default_storage.get_modified_time(name) > deadline:
+                    continue
+            except FileNotFoundError:
+                continue
+        default_storage.delete(name)
+
+
+def on_commit_delete_images(names):
+    '''Откладывает удаление до фиксации транзакции: откат не теряет файл.'''
+    transaction.on_commit(lambda: delete_unreferenced_images(names))
+
+
+def remember_recipe_image(sender, instance, update_fields=None, **kwargs):
+    instance._replaced_image = None
+    if instance.pk is None or (
+        update_fields is not None and 'image' not in update_fields
+    ):
+        return
+    old_image = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list('image', flat=True)
+        .first()
+    )
+    if old_image and old_image != instance.image.name:
+        instance._replaced_image = old_image
+
+
+def delete_replaced_recipe_image(sender, instance, **kwargs):
+    if getattr(instance, '_replaced_image', None):
+        on_commit_delete_images((instance._replaced_image,))
+
+
+def delete_recipe_image(sender, instance, **kwargs):
+    on_commit_delete_images((instance.image.name,))
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from food.recommendations import (
+    MAX_USER_ITEMS,
+    NEIGHBOURS,
+    build_neighbours,
+    read_interactions,
+    save_neighbours,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит соседей рецептов для рекомендаций по избранному '
+        'и корзинам и сохраняет их в RECOMMENDATIONS_PATH.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbours', type=int, default=NEIGHBOURS)
+        parser.add_argument(
+            '--max-user-items', type=int, default=MAX_USER_ITEMS
+        )
+        parser.add_argument('--output', default=settings.RECOMMENDATIONS_PATH)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users, items, weights = read_interactions()
+        read_at = time.perf_counter()
+        result = build_neighbours(
+            users,
+            items,
+            weights,
+            neighbours=options['neighbours'],
+            max_user_items=options['max_user_items'],
+        )
+        built_at = time.perf_counter()
+        save_neighbours(result, options['output'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Взаимодействий {users.size}, рецептов {result.size}: '
+                f'чтение {read_at - started:.1f} с, '
+                f'расчёт {built_at - read_at:.1f} с, '
+                f'файл {result.nbytes / 1024 / 1024:.1f} МБ.'
+            )
+        )
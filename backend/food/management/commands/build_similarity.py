@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from food.models import Recipe
+from food.similarity import (
+    get_ingredient_ids,
+    iter_ingredient_pairs,
+    similarity_index,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает индекс похожих по ингредиентам рецептов '
+        '(MinHash и LSH). Рецепты из API попадают в индекс сразу, '
+        'пересборка нужна после массового импорта и чтобы сжать '
+        'список изменённых рецептов.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        capacity = Recipe.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        recipes = similarity_index.rebuild(iter_ingredient_pairs(), capacity)
+        # Рецепты, изменённые во время сборки, могли попасть в неё
+        # в старом виде: их подписи пересчитываются заново.
+        pending = similarity_index.get_pending()
+        for recipe_id in pending.tolist():
+            similarity_index.write_signature(
+                recipe_id, get_ingredient_ids(recipe_id)
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'В индексе {recipes} рецептов, изменено во время сборки '
+                f'{pending.size}, за {time.perf_counter() - started:.1f} с.'
+            )
+        )
@@ -0,0 +1,161 @@
+import os
+import shutil
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models.functions import Collate
+
+from food.images import ORPHAN_MIN_AGE
+from food.models import Recipe
+
+BATCH_SIZE = 1000
+
+
+def iter_files(root, prefix=''):
+    '''
+    Имена файлов под root в порядке сравнения строк.
+
+    Каталог сортируется как имя с '/' на конце, поэтому 'b.png'
+    идёт раньше 'b/...' - так же, как упорядочит имена БД.
+    '''
+    try:
+        entries = list(os.scandir(os.path.join(root, prefix)))
+    except FileNotFoundError:
+        return
+    entries.sort(
+        key=lambda entry: entry.name + '/'
+        if entry.is_dir(follow_symlinks=False)
+        else entry.name
+    )
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_files(root, f'{prefix}{entry.name}/')
+        elif entry.is_file(follow_symlinks=False):
+            yield f'{prefix}{entry.name}', entry
+
+
+def iter_references(directory):
+    '''Различные Recipe.image из directory по возрастанию, курсором.'''
+    image = 'image'
+    if connection.vendor == 'postgresql':
+        # Порядок строк должен совпадать с побайтовым порядком Python.
+        image = Collate('image', 'C')
+    previous = None
+    for name in (
+        Recipe.objects.filter(image__startswith=directory)
+        .order_by(image)
+        .values_list('image', flat=True)
+        .iterator(chunk_size=BATCH_SIZE * 10)
+    ):
+        if name != previous:
+            yield name
+            previous = name
+
+
+def iter_orphans(files, references):
+    '''Разность двух отсортированных потоков: файлы без ссылок.'''
+    reference = next(references, None)
+    for name, entry in files:
+        while reference is not None and reference < name:
+            reference = next(references, None)
+        if name != reference:
+            yield name, entry
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет или переносит в карантин картинки рецептов, на которые '
+        'не ссылается ни один рецепт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=ORPHAN_MIN_AGE,
+            help=(
+                'Не трогать файлы моложе стольких секунд: их транзакция '
+                'могла ещё не зафиксироваться.'
+            ),
+        )
+        parser.add_argument(
+            '--quarantine',
+            help='Переносить файлы в этот каталог вместо удаления.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что было бы удалено.',
+        )
+
+    def handle(self, *args, **options):
+        if not hasattr(default_storage, 'path'):
+            raise CommandError('Нужно файловое хранилище на диске.')
+        self.options = options
+        self.verbosity = options['verbosity']
+        self.stats = dict.fromkeys(('files', 'orphans', 'bytes'), 0)
+        started = time.perf_counter()
+        directory = Recipe._meta.get_field('image').upload_to.rstrip('/')
+        root = default_storage.path('')
+        deadline = time.time() - options['min_age']
+
+        batch = []
+        for name, entry in iter_orphans(
+            self.count_files(iter_files(root, f'{directory}/')),
+            iter_references(f'{directory}/'),
+        ):
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > deadline:
+                continue
+            batch.append((name, stat.st_size))
+            if len(batch) >= options['batch_size']:
+                self.collect_batch(batch)
+                batch = []
+        if batch:
+            self.collect_batch(batch)
+
+        action = (
+            'перенесено в карантин' if options['quarantine'] else 'удалено'
+        )
+        if options['dry_run']:
+            action = f'было бы {action}'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Файлов {self.stats["files"]}, {action} '
+                f'{self.stats["orphans"]} '
+                f'({self.stats["bytes"] / 1024 / 1024:.1f} МБ) '
+                f'за {time.perf_counter() - started:.1f} с.'
+            )
+        )
+
+    def count_files(self, files):
+        for item in files:
+            self.stats['files'] += 1
+            yield item
+
+    def collect_batch(self, batch):
+        names = {name for name, _ in batch}
+        # Ссылка могла появиться после чтения потока: проверяем ещё раз.
+        names -= set(
+            Recipe.objects.filter(image__in=names).values_list(
+                'image', flat=True
+            )
+        )
+        for name, size in batch:
+            if name not in names:
+                continue
+            self.stats['orphans'] += 1
+            self.stats['bytes'] += size
+            if self.verbosity > 1:
+                self.stdout.write(name)
+            if self.options['dry_run']:
+                continue
+            if self.options['quarantine']:
+                target = os.path.join(self.options['quarantine'], name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(default_storage.path(name), target)
+            else:
+                default_storage.delete(name)
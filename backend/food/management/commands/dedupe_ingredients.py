@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.settings import MAX_AMOUNT_COUNT
+from food.dedupe import (
+    exclude_overflowing,
+    find_duplicate_clusters,
+    get_catalogue,
+    merge_ingredients,
+)
+
+THRESHOLD = 0.7
+
+
+class Command(BaseCommand):
+    help = (
+        'Ищет дубли в каталоге ингредиентов (регистр, пробелы, синонимы, '
+        'опечатки, кг/г и л/мл) и показывает предлагаемые слияния; '
+        'с --apply переносит рецепты на целевые ингредиенты и удаляет '
+        'дубли.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=THRESHOLD,
+            help='Порог сходства триграмм для поиска опечаток.',
+        )
+        parser.add_argument(
+            '--apply',
+            action='store_true',
+            help='Выполнить слияния, а не только показать их.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        catalogue = get_catalogue()
+        clusters = find_duplicate_clusters(catalogue, options['threshold'])
+        clusters, overflowing = exclude_overflowing(clusters)
+        found_at = time.perf_counter()
+
+        names = {id: f'{name} ({unit})' for id, name, unit, _ in catalogue}
+        for target, sources in clusters:
+            self.stdout.write(
+                f'{names[target]} <- '
+                + ', '.join(
+                    names[source] + (f' x{factor}' if factor > 1 else '')
+                    for source, factor in sources
+                )
+            )
+        for source in overflowing:
+            self.stderr.write(
+                f'{names[source]}: количество после перевода единиц '
+                f'или сложения строк рецепта больше {MAX_AMOUNT_COUNT}, '
+                f'пропущено.'
+            )
+        duplicates = sum(len(sources) for _, sources in clusters)
+        self.stdout.write(
+            f'Ингредиентов {len(catalogue)}, групп дублей {len(clusters)}, '
+            f'дублей {duplicates}, поиск {found_at - started:.1f} с.'
+        )
+        if not options['apply'] or not clusters:
+            return
+        moved, merged, deleted = merge_ingredients(clusters)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Перенесено строк рецептов {moved}, объединено {merged}, '
+                f'удалено ингредиентов {deleted} за '
+                f'{time.perf_counter() - found_at:.1f} с. Индекс похожих '
+                f'рецептов устарел: выполните manage.py build_similarity.'
+            )
+        )
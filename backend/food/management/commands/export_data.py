@@ -0,0 +1,60 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from food.exports import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    EXPORTS,
+    iter_export,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая выгрузка рецептов с ингредиентами, избранного, корзин '
+        'и подписок в CSV или JSONL с постоянным расходом памяти.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжимать вывод на лету.'
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Файл для выгрузки, по умолчанию stdout.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        chunks = iter_export(
+            options['name'],
+            options['format'],
+            options['gzip'],
+            options['chunk_size'],
+        )
+        started = time.perf_counter()
+        written = 0
+        if options['output'] == '-':
+            output = sys.stdout.buffer
+        else:
+            output = open(options['output'], 'wb')
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+            else:
+                output.flush()
+        self.stderr.write(
+            f'{options["name"]}: {written / 1024 / 1024:.1f} МБ '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
@@ -0,0 +1,364 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from itertools import islice
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from backend.settings import (
+    MAX_AMOUNT_COUNT,
+    MAX_COOKING_TIME,
+    MIN_AMOUNT_COUNT,
+    MIN_COOKING_TIME,
+)
+from food.catalogue import get_tags_catalogue
+from food.images import store_recipe_image
+from food.models import Ingredient, Recipe, RecipeIngredient
+from users.models import User
+
+BATCH_SIZE = 500
+RECIPE_NAME_LENGTH = Recipe._meta.get_field('name').max_length
+INGREDIENT_NAME_LENGTH = Ingredient._meta.get_field('name').max_length
+INGREDIENT_UNIT_LENGTH = Ingredient._meta.get_field(
+    'measurement_unit'
+).max_length
+
+
+def store_image(path):
+    '''Обёртка для пула процессов: ошибка возвращается, а не бросается.'''
+    try:
+        return store_recipe_image(path), None
+    except (OSError, ValueError) as error:
+        return None, str(error)
+
+
+class Command(BaseCommand):
+    help = (
+        'Массовый импорт рецептов из JSONL с картинками. Каждая строка: '
+        '{"name", "text", "cooking_time", "author", "image", '
+        '"tags": [slug], "ingredients": [{"name", "measurement_unit", '
+        '"amount"}]}; image - путь относительно --images. '
+        'Прерванный импорт продолжается с последней сохранённой пачки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help='Файл JSONL с рецептами.')
+        parser.add_argument(
+            '--images',
+            help='Каталог с картинками, по умолчанию каталог архива.',
+        )
+        parser.add_argument(
+            '--author',
+            help='Username автора для строк без author или с неизвестным.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Число процессов обработки картинок.',
+        )
+        parser.add_argument(
+            '--create-ingredients',
+            action='store_true',
+            help=(
+                'Добавлять в каталог ингредиенты, которых в нём нет; '
+                'без флага такие рецепты пропускаются с ошибкой.'
+            ),
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать сначала, не глядя на сохранённый прогресс.',
+        )
+
+    def handle(self, *args, **options):
+        archive = options['archive']
+        images_dir = options['images'] or os.path.dirname(
+            os.path.abspath(archive)
+        )
+        progress_path = f'{archive}.progress'
+        start = 0
+        if not options['restart'] and os.path.exists(progress_path):
+            with open(progress_path) as progress_file:
+                start = int(progress_file.read() or 0)
+            self.stderr.write(f'Продолжение со строки {start + 1}.')
+
+        self.default_author = None
+        if options['author']:
+            self.default_author = User.objects.filter(
+                username=options['author']
+            ).first()
+            if self.default_author is None:
+                raise CommandError(
+                    f'Пользователь {options["author"]} не найден.'
+                )
+        self.tags = get_tags_catalogue()
+        self.create_ingredients = options['create_ingredients']
+        self.stats = dict.fromkeys(
+            ('created', 'duplicates', 'errors', 'images'), 0
+        )
+
+        started = time.perf_counter()
+        line_number = start
+        # Пул создаёт процессы по мере задач, уже после запросов к БД.
+        # Запущенные через spawn, они не наследуют открытое соединение
+        # родителя, которое при выходе закрыли бы и у него.
+        with open(archive, encoding='utf-8') as lines, ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        ) as pool:
+            lines = islice(lines, start, None)
+            while True:
+                batch = list(islice(lines, options['batch_size']))
+                if not batch:
+                    break
+                self.import_batch(
+                    batch, line_number, images_dir, pool, options['workers']
+                )
+                line_number += len(batch)
+                with open(f'{progress_path}.tmp', 'w') as progress_file:
+                    progress_file.write(str(line_number))
+                os.replace(f'{progress_path}.tmp', progress_path)
+                elapsed = time.perf_counter() - started
+                self.stderr.write(
+                    f'Строк {line_number}: создано {self.stats["created"]}, '
+                    f'повторов {self.stats["duplicates"]}, '
+                    f'ошибок {self.stats["errors"]}; '
+                    f'{(line_number - start) / elapsed:.0f} строк/с, '
+                    f'{self.stats["images"] / elapsed:.1f} картинок/с'
+                )
+        # Файла нет, если в архиве не нашлось ни одной новой строки.
+        with suppress(FileNotFoundError):
+            os.remove(progress_path)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Импорт завершён: создано {self.stats["created"]} рецептов '
+                f'за {time.perf_counter() - started:.1f} с.'
+            )
+        )
+
+    def error(self, number, message):
+        self.stats['errors'] += 1
+        self.stderr.write(f'Строка {number}: {message}')
+
+    def parse(self, batch, first_number):
+        '''Разбирает и проверяет строки пачки, без запросов к БД.'''
+        records = []
+        for number, line in enumerate(batch, first_number + 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                cooking_time = int(record['cooking_time'])
+                # Повторы одного ингредиента в рецепте складываются.
+                ingredients = {}
+                for item in record['ingredients']:
+                    key = (item['name'].strip(), item['measurement_unit'])
+                    ingredients[key] = ingredients.get(key, 0) + int(
+                        item['amount']
+                    )
+                for amount in ingredients.values():
+                    if not MIN_AMOUNT_COUNT <= amount <= MAX_AMOUNT_COUNT:
+                        raise ValueError(f'количество {amount}')
+                if not MIN_COOKING_TIME <= cooking_time <= MAX_COOKING_TIME:
+                    raise ValueError(f'время приготовления {cooking_time}')
+                if not ingredients:
+                    raise ValueError('нет ингредиентов')
+                for name, unit in ingredients:
+                    if (
+                        len(name) > INGREDIENT_NAME_LENGTH
+                        or len(unit) > INGREDIENT_UNIT_LENGTH
+                    ):
+                        raise ValueError(f'ингредиент {name} ({unit})')
+                if len(record['name'].strip()) > RECIPE_NAME_LENGTH:
+                    raise ValueError('слишком длинное название')
+                tags = record.get('tags', [])
+                if not isinstance(tags, list) or not all(
+                    isinstance(slug, str) for slug in tags
+                ):
+                    raise ValueError('tags - не список slug')
+                records.append(
+                    {
+                        'number': number,
+                        'author': record.get('author'),
+                        'name': record['name'].strip(),
+                        'text': record['text'],
+                        'cooking_time': cooking_time,
+                        'image': record['image'],
+                        'tags': tags,
+                        'ingredients': ingredients,
+                    }
+                )
+            except (KeyError, TypeError, ValueError, AttributeError) as error:
+                self.error(number, f'неверная запись ({error!r}).')
+        return records
+
+    def resolve_authors(self, records):
+        authors = dict(
+            User.objects.filter(
+                username__in={record['author'] for record in records}
+            ).values_list('username', 'id')
+        )
+        resolved = []
+        for record in records:
+            author_id = authors.get(record['author'])
+            if author_id is None and self.default_author is not None:
+                author_id = self.default_author.id
+            if author_id is None:
+                self.error(
+                    record['number'], f'автор {record["author"]} не найден.'
+                )
+                continue
+            record['author_id'] = author_id
+            resolved.append(record)
+        return resolved
+
+    def skip_existing(self, records):
+        '''
+        Отбрасывает рецепты, уже импортированные с тем же автором
+        и названием: повтор пачки после сбоя ничего не задвоит.
+        '''
+        existing = set(
+            Recipe.objects.filter(
+                author_id__in={record['author_id'] for record in records},
+                name__in={record['name'] for record in records},
+            ).values_list('author_id', 'name')
+        )
+        fresh = []
+        for record in records:
+            key = (record['author_id'], record['name'])
+            if key in existing:
+                self.stats['duplicates'] += 1
+                continue
+            existing.add(key)
+            fresh.append(record)
+        return fresh
+
+    def store_images(self, records, images_dir, pool, workers):
+        paths = [
+            os.path.join(images_dir, record['image']) for record in records
+        ]
+        stored = []
+        for record, (name, error) in zip(
+            records,
+            pool.map(
+                store_image,
+                paths,
+                chunksize=max(1, len(paths) // (workers * 4)),
+            ),
+        ):
+            if error:
+                self.error(record['number'], error)
+                continue
+            record['image'] = name
+            self.stats['images'] += 1
+            stored.append(record)
+        return stored
+
+    def resolve_ingredients(self, records):
+        '''
+        Заменяет (название, единица) ингредиентов на id каталога.
+
+        Рецепты с ингредиентами не из каталога пропускаются с ошибкой:
+        варианты написания партнёров не должны разрастать каталог.
+        С --create-ingredients такие ингредиенты добавляются.
+        '''
+        keys = {key for record in records for key in record['ingredients']}
+        names = {name for name, _ in keys}
+        if self.create_ingredients:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in keys
+                ),
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+        catalogue = {
+            (name, unit): id
+            for id, name, unit in Ingredient.objects.filter(
+                name__in=names
+            ).values_list('id', 'name', 'measurement_unit')
+        }
+        resolved = []
+        for record in records:
+            unknown = [
+                f'{name} ({unit})'
+                for name, unit in record['ingredients']
+                if (name, unit) not in catalogue
+            ]
+            if unknown:
+                self.error(
+                    record['number'],
+                    'ингредиентов нет в каталоге: ' + ', '.join(unknown),
+                )
+                continue
+            record['ingredients'] = {
+                catalogue[key]: amount
+                for key, amount in record['ingredients'].items()
+            }
+            resolved.append(record)
+        return resolved
+
+    def import_batch(self, batch, first_number, images_dir, pool, workers):
+        records = self.parse(batch, first_number)
+        if records:
+            records = self.skip_existing(self.resolve_authors(records))
+        if records:
+            records = self.resolve_ingredients(records)
+        if records:
+            records = self.store_images(records, images_dir, pool, workers)
+        if not records:
+            return
+        with transaction.atomic():
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author_id=record['author_id'],
+                    name=record['name'],
+                    text=record['text'],
+                    image=record['image'],
+                    cooking_time=record['cooking_time'],
+                )
+                for record in records
+            )
+            if not connection.features.can_return_rows_from_bulk_insert:
+                ids = {
+                    (author_id, name): id
+                    for id, author_id, name in Recipe.objects.filter(
+                        author_id__in={recipe.author_id for recipe in recipes},
+                        name__in={recipe.name for recipe in recipes},
+                    ).values_list('id', 'author_id', 'name')
+                }
+                for recipe in recipes:
+                    recipe.id = ids[recipe.author_id, recipe.name]
+            RecipeIngredient.objects.bulk_create(
+                (
+                    RecipeIngredient(
+                        recipe_id=recipe.id,
+                        ingredients_id=ingredient_id,
+                        amount=amount,
+                    )
+                    for recipe, record in zip(recipes, records)
+                    for ingredient_id, amount in record['ingredients'].items()
+                ),
+                batch_size=BATCH_SIZE,
+            )
+            Recipe.tags.through.objects.bulk_create(
+                (
+                    Recipe.tags.through(
+                        recipe_id=recipe.id, tag_id=self.tags[slug]
+                    )
+                    for recipe, record in zip(recipes, records)
+                    for slug in set(record['tags'])
+                    if slug in self.tags
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        self.stats['created'] += len(recipes)
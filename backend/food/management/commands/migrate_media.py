@@ -0,0 +1,117 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from food.models import Recipe
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки рецептов в хранилище с именами по содержимому '
+        'и обновляет Recipe.image пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--delete-old',
+            action='store_true',
+            help='Удалить старые файлы, на которые больше нет ссылок.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, ничего не записывая.',
+        )
+
+    def handle(self, *args, **options):
+        if not hasattr(default_storage, 'get_hashed_name'):
+            raise CommandError(
+                'DEFAULT_FILE_STORAGE должен быть ContentAddressedStorage.'
+            )
+        self.options = options
+        # Файлы, которые были бы созданы при --dry-run.
+        self.planned = set()
+        self.stats = dict.fromkeys(
+            ('recipes', 'files', 'duplicates', 'missing', 'deleted'), 0
+        )
+        started = time.perf_counter()
+        rows = (
+            Recipe.objects.exclude(image='')
+            .order_by('id')
+            .values_list('id', 'image')
+            .iterator(chunk_size=options['batch_size'])
+        )
+        batch = []
+        for row in rows:
+            if default_storage.is_hashed_name(row[1]):
+                continue
+            batch.append(row)
+            if len(batch) >= options['batch_size']:
+                self.migrate_batch(batch)
+                batch = []
+        if batch:
+            self.migrate_batch(batch)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Рецептов {self.stats["recipes"]}, '
+                f'новых файлов {self.stats["files"]}, '
+                f'совпавших по содержимому {self.stats["duplicates"]}, '
+                f'не найдено {self.stats["missing"]}, '
+                f'удалено старых {self.stats["deleted"]} '
+                f'за {time.perf_counter() - started:.1f} с.'
+            )
+        )
+
+    def migrate_batch(self, batch):
+        # В пачке часто повторяется один файл: он хешируется один раз.
+        renamed = {}
+        for _, name in batch:
+            if name in renamed:
+                continue
+            if not default_storage.exists(name):
+                self.stats['missing'] += 1
+                self.stderr.write(f'Нет файла {name}.')
+                renamed[name] = None
+                continue
+            with default_storage.open(name) as content:
+                hashed_name = default_storage.get_hashed_name(name, content)
+                if hashed_name in self.planned or default_storage.exists(
+                    hashed_name
+                ):
+                    self.stats['duplicates'] += 1
+                elif self.options['dry_run']:
+                    self.stats['files'] += 1
+                    self.planned.add(hashed_name)
+                else:
+                    self.stats['files'] += 1
+                    default_storage._save(hashed_name, content)
+            renamed[name] = hashed_name
+
+        recipes = [
+            Recipe(id=id, image=renamed[name])
+            for id, name in batch
+            if renamed[name]
+        ]
+        self.stats['recipes'] += len(recipes)
+        if self.options['dry_run']:
+            return
+        with transaction.atomic():
+            Recipe.objects.bulk_update(recipes, ('image',))
+        if self.options['delete_old']:
+            old_names = {
+                name for name, hashed_name in renamed.items() if hashed_name
+            }
+            # Файл мог остаться у рецептов из следующих пачек.
+            old_names -= set(
+                Recipe.objects.filter(image__in=old_names).values_list(
+                    'image', flat=True
+                )
+            )
+            for name in old_names:
+                default_storage.delete(name)
+            self.stats['deleted'] += len(old_names)
@@ -0,0 +1,157 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from food.models import (
+    Favorite,
+    Follow,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Shopping,
+    Tag,
+)
+from users.models import User
+
+SEED_PREFIX = 'seed'
+SEED_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+SEED_UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'по вкусу')
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными для бенчмарков.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--per-recipe', type=int, default=8)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--follows', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        start = User.objects.filter(username__startswith=SEED_PREFIX).count()
+
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{SEED_PREFIX}{number}',
+                    email=f'{SEED_PREFIX}{number}@example.com',
+                    first_name='Seed',
+                    last_name=str(number),
+                    password='!',
+                )
+                for number in range(start, start + options['users'])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        users = list(User.objects.filter(username__startswith=SEED_PREFIX))
+
+        for name, color, slug in SEED_TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )
+        tags = list(Tag.objects.all())
+
+        existing = Ingredient.objects.count()
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=f'{SEED_PREFIX} ингредиент {number}',
+                    measurement_unit=rnd.choice(SEED_UNITS),
+                )
+                for number in range(
+                    existing, existing + options['ingredients']
+                )
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=rnd.choice(users),
+                    name=f'{SEED_PREFIX} рецепт {number}',
+                    image='food/images/temp.png',
+                    text='Описание рецепта. ' * rnd.randint(1, 20),
+                    cooking_time=rnd.randint(1, 180),
+                )
+                for number in range(options['recipes'])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        recipe_ids = list(
+            Recipe.objects.filter(name__startswith=SEED_PREFIX)
+            .order_by('-id')
+            .values_list('id', flat=True)[: options['recipes']]
+        )
+
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredients_id=ingredient_id,
+                    amount=rnd.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in rnd.sample(
+                    ingredient_ids,
+                    min(options['per_recipe'], len(ingredient_ids)),
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+                for recipe_id in recipe_ids
+                for tag in rnd.sample(tags, rnd.randint(1, len(tags)))
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+        for model, per_user in (
+            (Favorite, options['favorites']),
+            (Shopping, options['favorites'] // 4),
+        ):
+            model.objects.bulk_create(
+                (
+                    model(user=user, recipe_id=recipe_id)
+                    for user in users
+                    for recipe_id in rnd.sample(
+                        recipe_ids, min(per_user, len(recipe_ids))
+                    )
+                ),
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+        Follow.objects.bulk_create(
+            (
+                Follow(user=user, following=following)
+                for user in users
+                for following in rnd.sample(
+                    users, min(options['follows'], len(users))
+                )
+                if following != user
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Создано: пользователей {len(users) - start}, '
+                f'рецептов {len(recipe_ids)}.'
+            )
+        )
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('food', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(
+                fields=['recipe', 'user'], name='favorite_recipe_user_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(
+                fields=['following', 'user'], name='follow_following_user_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(
+                fields=['author', '-id'], name='recipe_author_id_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(
+                fields=['recipe', 'ingredients'],
+                include=('amount',),
+                name='recipe_ingredient_amount_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='shopping',
+            index=models.Index(
+                fields=['recipe', 'user'], name='shopping_recipe_user_idx'
+            ),
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON food_recipe_tags (tag_id, recipe_id);',
+            reverse_sql='DROP INDEX recipe_tags_tag_recipe_idx;',
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# Индексы под поиск в админке: '^name' и '=field' превращаются
+# в UPPER(field::text) LIKE/=, а text_pattern_ops позволяет
+# использовать индекс для поиска по префиксу. Только PostgreSQL.
+SEARCH_INDEXES = (
+    ('recipe_name_upper_idx', 'food_recipe', 'name'),
+    ('ingredient_name_upper_idx', 'food_ingredient', 'name'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'(UPPER({column}::text) text_pattern_ops);'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name};')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('food', '0002_filter_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
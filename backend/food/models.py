@@ -80,6 +80,11 @@ class Recipe(models.Model):
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('author', '-id'), name='recipe_author_id_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -109,6 +114,13 @@ class RecipeIngredient(models.Model):
     class Meta:
         verbose_name = 'Связь рецепта и ингредиента'
         verbose_name_plural = 'Связь рецептов и ингредиентов'
+        indexes = (
+            models.Index(
+                fields=('recipe', 'ingredients'),
+                include=('amount',),
+                name='recipe_ingredient_amount_idx',
+            ),
+        )
 
 
 class Favorite(models.Model):
@@ -133,6 +145,11 @@ class Favorite(models.Model):
                 fields=('user', 'recipe'), name='unique_user_recipes'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'), name='favorite_recipe_user_idx'
+            ),
+        )
 
 
 class Shopping(models.Model):
@@ -157,6 +174,11 @@ class Shopping(models.Model):
                 fields=('user', 'recipe'), name='unique_user_recipe'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'), name='shopping_recipe_user_idx'
+            ),
+        )
 
 
 class Follow(models.Model):
@@ -182,6 +204,11 @@ class Follow(models.Model):
                 fields=('user', 'following'), name='unique_user_following'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('following', 'user'), name='follow_following_user_idx'
+            ),
+        )
 
     def clean(self):
         if self.user == self.following:
@@ -0,0 +1,266 @@
+import os
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+
+from food.models import Favorite, Shopping
+
+# Вес взаимодействия: избранное говорит о вкусе больше, чем корзина.
+INTERACTIONS = ((Favorite, 1.0), (Shopping, 0.5))
+NEIGHBOURS = 50
+# Пользователи с огромной историей дают квадратичное число пар
+# и почти ничего не говорят о сходстве рецептов.
+MAX_USER_ITEMS = 500
+# Сходство пар, встретившихся у малого числа пользователей, занижается.
+SHRINKAGE = 10
+ITEMS_PER_BLOCK = 2048
+# Запас популярных рецептов для пользователей без истории.
+POPULAR = 1000
+READ_CHUNK = 100_000
+
+
+def get_dtype(neighbours):
+    return np.dtype(
+        [
+            ('recipe', np.int64),
+            ('popularity', np.float32),
+            ('neighbours', np.int64, neighbours),
+            ('scores', np.float32, neighbours),
+        ]
+    )
+
+
+def read_interactions():
+    '''
+    Взаимодействия пользователей с рецептами одним проходом по таблицам.
+
+    Строки читаются курсором частями и сразу складываются в массивы;
+    у пары (пользователь, рецепт) остаётся наибольший вес.
+    '''
+    users, items, weights = [], [], []
+    for model, weight in INTERACTIONS:
+        rows = model.objects.values_list('user_id', 'recipe_id').iterator(
+            chunk_size=READ_CHUNK
+        )
+        while True:
+            chunk = np.fromiter(
+                (value for row in islice(rows, READ_CHUNK) for value in row),
+                dtype=np.int64,
+            )
+            if not chunk.size:
+                break
+            users.append(chunk[0::2])
+            items.append(chunk[1::2])
+            weights.append(np.full(chunk.size // 2, weight, np.float32))
+    if not users:
+        empty = np.empty(0, np.int64)
+        return empty, empty, np.empty(0, np.float32)
+    return deduplicate(
+        np.concatenate(users), np.concatenate(items), np.concatenate(weights)
+    )
+
+
+def deduplicate(users, items, weights):
+    order = np.lexsort((-weights, items, users))
+    users, items, weights = users[order], items[order], weights[order]
+    first = np.ones(users.size, bool)
+    first[1:] = (users[1:] != users[:-1]) | (items[1:] != items[:-1])
+    return users[first], items[first], weights[first]
+
+
+def to_csr(rows, columns, values):
+    '''Строки rows -> (indptr, columns, values), rows уже 0..n-1.'''
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(rows.max() + 2 if rows.size else 1, np.int64)
+    np.cumsum(np.bincount(rows, minlength=indptr.size - 1), out=indptr[1:])
+    return indptr, columns[order], values[order]
+
+
+def expand(indptr, rows):
+    '''Позиции всех элементов строк rows в CSR, без цикла по строкам.'''
+    starts, lengths = indptr[rows], indptr[rows + 1] - indptr[rows]
+    total = lengths.sum()
+    owners = np.repeat(np.arange(rows.size), lengths)
+    offsets = np.arange(total) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    return owners, starts[owners] + offsets
+
+
+def build_neighbours(
+    users,
+    items,
+    weights,
+    neighbours=NEIGHBOURS,
+    max_user_items=MAX_USER_ITEMS,
+    shrinkage=SHRINKAGE,
+):
+    '''
+    Item-item косинусное сходство рецептов по взаимодействиям.
+
+    Матрица пользователь x рецепт хранится в двух CSR (по пользователям
+    и по рецептам). Рецепты обрабатываются блоками: для блока
+    разворачиваются все пары (рецепт, пользователь, другой рецепт)
+    и суммируются произведения весов через сортировку ключей - так
+    считается часть произведения X^T X без плотной матрицы. Для каждого
+    рецепта остаются neighbours лучших соседей. Возвращает
+    структурированный массив get_dtype(neighbours), упорядоченный
+    по id рецепта.
+    '''
+    recipe_ids, item_index = np.unique(items, return_inverse=True)
+    _, user_index = np.unique(users, return_inverse=True)
+    dtype = get_dtype(neighbours)
+    result = np.zeros(recipe_ids.size, dtype)
+    result['recipe'] = recipe_ids
+    result['neighbours'] = -1
+    if not recipe_ids.size:
+        return result
+
+    by_user = to_csr(user_index, item_index, weights)
+    if max_user_items:
+        # От длинной истории остаются max_user_items самых новых
+        # рецептов (с наибольшими id).
+        indptr, columns, values = by_user
+        lengths = np.diff(indptr)
+        keep = np.arange(columns.size) >= np.repeat(
+            indptr[1:] - np.minimum(lengths, max_user_items), lengths
+        )
+        kept_users = np.repeat(np.arange(lengths.size), lengths)[keep]
+        by_user = to_csr(kept_users, columns[keep], values[keep])
+        item_index = columns[keep]
+        user_index = kept_users
+        weights = values[keep]
+    by_item = to_csr(item_index, user_index, weights)
+    norms = np.sqrt(
+        np.bincount(item_index, weights**2, minlength=recipe_ids.size)
+    )
+    result['popularity'] = np.bincount(
+        item_index, weights, minlength=recipe_ids.size
+    )
+
+    for start in range(0, recipe_ids.size, ITEMS_PER_BLOCK):
+        block = np.arange(start, min(start + ITEMS_PER_BLOCK, recipe_ids.size))
+        owners, positions = expand(by_item[0], block)
+        block_items = block[owners]
+        block_users = by_item[1][positions]
+        block_weights = by_item[2][positions]
+        owners, positions = expand(by_user[0], block_users)
+        left = block_items[owners]
+        right = by_user[1][positions]
+        products = block_weights[owners] * by_user[2][positions]
+        different = left != right
+        keys = left[different] * recipe_ids.size + right[different]
+        keys, inverse = np.unique(keys, return_inverse=True)
+        dot = np.bincount(inverse, products[different])
+        support = np.bincount(inverse)
+        left, right = np.divmod(keys, recipe_ids.size)
+        scores = (
+            dot
+            / (norms[left] * norms[right])
+            * support
+            / (support + shrinkage)
+        ).astype(np.float32)
+
+        # Лучшие соседи каждого рецепта: сортировка по (рецепт, -сходство)
+        # и ранг внутри группы рецепта.
+        order = np.lexsort((-scores, left))
+        left, right, scores = left[order], right[order], scores[order]
+        group_starts = np.searchsorted(left, left, side='left')
+        rank = np.arange(left.size) - group_starts
+        top = rank < neighbours
+        rows, ranks = left[top], rank[top]
+        result['neighbours'][rows, ranks] = recipe_ids[right[top]]
+        result['scores'][rows, ranks] = scores[top]
+    return result
+
+
+def save_neighbours(result, path=None):
+    '''Пишет массив во временный файл и атомарно подменяет старый.'''
+    path = path or settings.RECOMMENDATIONS_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.tmp', 'wb') as output:
+        np.save(output, result)
+    os.replace(f'{path}.tmp', path)
+
+
+class NeighboursIndex:
+    '''
+    Соседи рецептов из файла build_recommendations через np.memmap.
+
+    Страницы файла общие для всех воркеров и читаются по требованию;
+    после подмены файла индекс открывается заново.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        # (inode и mtime файла, массив, популярные рецепты) меняются
+        # одним присваиванием: потоки воркера видят согласованный набор.
+        self.state = (None, None, None)
+
+    def load(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.state = (None, None, None)
+            return self.state
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        if identity != self.state[0]:
+            array = np.load(self.path, mmap_mode='r')
+            popularity = np.asarray(array['popularity'])
+            count = min(POPULAR, popularity.size)
+            popular = np.argpartition(-popularity, count - 1)[:count]
+            popular = popular[np.argsort(-popularity[popular], kind='stable')]
+            self.state = (
+                identity,
+                array,
+                np.asarray(array['recipe'][popular]).tolist(),
+            )
+        return self.state
+
+    def recommend(self, history, weights, limit):
+        '''
+        Рецепты, похожие на history: сходства соседей суммируются
+        с весами взаимодействий, уже знакомые рецепты отбрасываются.
+        Если соседей не хватает, список добирается популярными.
+        '''
+        _, array, popular = self.load()
+        if array is None or not array.size:
+            return []
+        history = np.asarray(history, np.int64)
+        rows = np.minimum(
+            np.searchsorted(array['recipe'], history), array.size - 1
+        )
+        found = array['recipe'][rows] == history
+        rows, weights = rows[found], np.asarray(weights, np.float32)[found]
+        candidates = np.asarray(array['neighbours'][rows]).ravel()
+        scores = (
+            np.asarray(array['scores'][rows]) * weights[:, np.newaxis]
+        ).ravel()
+        valid = (candidates >= 0) & ~np.isin(candidates, history)
+        candidates, inverse = np.unique(candidates[valid], return_inverse=True)
+        totals = np.bincount(inverse, scores[valid])
+        order = np.argsort(-totals, kind='stable')[:limit]
+        recommended = candidates[order].tolist()
+        if len(recommended) < limit:
+            seen = set(history.tolist()) | set(recommended)
+            recommended += [
+                recipe for recipe in popular if recipe not in seen
+            ][: limit - len(recommended)]
+        return recommended
+
+
+neighbours_index = NeighboursIndex(settings.RECOMMENDATIONS_PATH)
+
+
+def get_user_history(user, limit):
+    '''Последние взаимодействия пользователя: id рецептов и веса.'''
+    weights = {}
+    for model, weight in INTERACTIONS:
+        for recipe_id in (
+            model.objects.filter(user=user)
+            .order_by('-id')
+            .values_list('recipe_id', flat=True)[:limit]
+        ):
+            weights[recipe_id] = max(weights.get(recipe_id, 0), weight)
+    return list(weights), list(weights.values())
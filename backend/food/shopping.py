@@ -0,0 +1,97 @@
+from decimal import ROUND_HALF_UP, Decimal
+from operator import itemgetter
+
+from django.db.models import Case, CharField, F, IntegerField, Sum, Value, When
+
+from food.models import RecipeIngredient
+
+# Единица -> (базовая единица, множитель). Переводятся только точные
+# метрические единицы: ложки и стаканы для разных продуктов весят
+# по-разному и остаются отдельными строками.
+UNIT_CONVERSIONS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+}
+
+# Базовая единица -> (крупная единица, множитель) для вывода.
+DISPLAY_UNITS = {
+    'г': ('кг', 1000),
+    'мл': ('л', 1000),
+}
+DISPLAY_PRECISION = Decimal('0.01')
+
+# Одинаковые продукты под разными названиями каталога.
+CANONICAL_INGREDIENTS = {
+    'пекарский порошок': 'разрыхлитель',
+}
+
+
+def get_canonical_name():
+    '''Название продукта с заменой синонимов на каноническое.'''
+    aliases = {}
+    for alias, canonical in CANONICAL_INGREDIENTS.items():
+        aliases.setdefault(canonical, []).append(alias)
+    return Case(
+        *(
+            When(ingredients__name__in=names, then=Value(canonical))
+            for canonical, names in aliases.items()
+        ),
+        default=F('ingredients__name'),
+        output_field=CharField(),
+    )
+
+
+def format_amount(total, unit):
+    '''
+    Округление для списка покупок: от 1000 г и 1000 мл количество
+    выводится в кг и л с точностью до сотых, остальное как есть.
+    '''
+    if unit in DISPLAY_UNITS:
+        display_unit, factor = DISPLAY_UNITS[unit]
+        if total >= factor:
+            amount = (Decimal(total) / factor).quantize(
+                DISPLAY_PRECISION, rounding=ROUND_HALF_UP
+            )
+            return f'{amount.normalize():f}', display_unit
+    return str(total), unit
+
+
+def get_shopping_list(user):
+    '''
+    Список покупок пользователя одним запросом.
+
+    Синонимы сводятся к каноническому названию, метрические единицы
+    переводятся в базовые множителями CASE прямо в SUM, поэтому
+    «г» и «кг» или «мл» и «л» одного продукта дают одну строку.
+    '''
+    units = Case(
+        *(
+            When(ingredients__measurement_unit=unit, then=Value(base))
+            for unit, (base, _) in UNIT_CONVERSIONS.items()
+        ),
+        default=F('ingredients__measurement_unit'),
+        output_field=CharField(),
+    )
+    factors = Case(
+        *(
+            When(ingredients__measurement_unit=unit, then=Value(factor))
+            for unit, (_, factor) in UNIT_CONVERSIONS.items()
+        ),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    rows = (
+        RecipeIngredient.objects.filter(recipe__shopping__user=user)
+        .annotate(name=get_canonical_name(), unit=units)
+        .values('name', 'unit')
+        .annotate(total=Sum(F('amount') * factors))
+    )
+    shopping_list = []
+    # Сгруппированных строк немного, сортировать их дешевле в Python,
+    # чем добавлять ORDER BY к агрегату.
+    for row in sorted(rows, key=itemgetter('name', 'unit')):
+        amount, unit = format_amount(row['total'], row['unit'])
+        shopping_list.append(
+            {'name': row['name'], 'measurement_unit': unit, 'amount': amount}
+        )
+    return shopping_list
@@ -0,0 +1,286 @@
+import fcntl
+import logging
+import os
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+
+from food.models import RecipeIngredient
+
+logger = logging.getLogger(__name__)
+
+# 20 полос по 3 значения: рецепты с общими ингредиентами по Жаккару
+# 0.4 попадают в кандидаты с вероятностью ~0.73, 0.2 - ~0.15.
+BANDS = 20
+ROWS = 3
+NUM_PERM = BANDS * ROWS
+MERSENNE = (1 << 31) - 1
+# Коэффициенты фиксированы: подписи совпадают во всех процессах.
+_random = np.random.RandomState(46)
+HASH_A = _random.randint(1, MERSENNE, NUM_PERM).astype(np.uint64)
+HASH_B = _random.randint(0, MERSENNE, NUM_PERM).astype(np.uint64)
+BAND_MULTIPLIERS = _random.randint(1, MERSENNE, ROWS).astype(np.uint64) | 1
+GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+# Популярное сочетание ингредиентов не должно давать тысячи кандидатов.
+MAX_BUCKET = 200
+MIN_SIMILARITY = 0.2
+# Файл подписей растёт кусками, строка = id рецепта.
+GROW_ROWS = 1 << 16
+READ_CHUNK = 200_000
+SIGNATURE_BYTES = NUM_PERM * np.dtype(np.uint32).itemsize
+
+
+def get_signatures(recipes, ingredients):
+    '''
+    MinHash-подписи рецептов по парам (рецепт, ингредиент).
+
+    Пары должны быть упорядочены по рецепту. Для каждой из NUM_PERM
+    хеш-функций (a * x + b) mod p берётся минимум по ингредиентам
+    рецепта - одним np.minimum.reduceat на всю пачку. Значения
+    сдвинуты на 1, чтобы нулевая строка означала "нет подписи".
+    '''
+    recipes = np.asarray(recipes, np.int64)
+    starts = np.flatnonzero(np.r_[True, recipes[1:] != recipes[:-1]])
+    hashes = (
+        HASH_A[:, np.newaxis] * np.asarray(ingredients, np.uint64)
+        + HASH_B[:, np.newaxis]
+    ) % MERSENNE
+    signatures = np.minimum.reduceat(hashes, starts, axis=1).T + 1
+    return recipes[starts], signatures.astype(np.uint32)
+
+
+def get_band_keys(signatures):
+    '''Ключ каждой полосы подписи: 32 бита смеси её ROWS значений.'''
+    bands = signatures.reshape(-1, BANDS, ROWS).astype(np.uint64)
+    mixed = (bands * BAND_MULTIPLIERS).sum(axis=2) * GOLDEN
+    return (mixed >> np.uint64(32)).astype(np.uint32)
+
+
+class SimilarityIndex:
+    '''
+    Индекс похожих по ингредиентам рецептов: MinHash и LSH по полосам.
+
+    Файлы в каталоге path:
+    - signatures.bin - подписи, строка NUM_PERM x uint32 по id рецепта;
+      меняется на месте при записи рецепта, np.memmap общий для всех
+      воркеров;
+    - bands.npy - массив 2 x BANDS x N uint32: ключи полос,
+      отсортированные в каждой полосе, и id рецептов; строится
+      build_similarity и ищется бинарным поиском;
+    - pending.bin - id рецептов, изменённых после построения bands.npy:
+      их полосы считаются из подписей при поиске.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.signatures = (None, None)
+        self.bands = (None, None)
+
+    def get_path(self, name):
+        return os.path.join(self.path, name)
+
+    def get_signatures_array(self):
+        path = self.get_path('signatures.bin')
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        identity = (stat.st_ino, stat.st_size)
+        if identity != self.signatures[0]:
+            self.signatures = (
+                identity,
+                np.memmap(
+                    path,
+                    np.uint32,
+                    'r+',
+                    shape=(stat.st_size // SIGNATURE_BYTES, NUM_PERM),
+                )
+                if stat.st_size
+                else np.zeros((0, NUM_PERM), np.uint32),
+            )
+        return self.signatures[1]
+
+    def get_bands_array(self):
+        path = self.get_path('bands.npy')
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        if identity != self.bands[0]:
+            self.bands = (identity, np.load(path, mmap_mode='r'))
+        return self.bands[1]
+
+    def get_pending(self):
+        ids = [
+            np.fromfile(self.get_path(name), np.int64)
+            for name in ('pending.bin.old', 'pending.bin')
+            if os.path.exists(self.get_path(name))
+        ]
+        return np.unique(np.concatenate(ids)) if ids else np.empty(0, int)
+
+    def ensure_capacity(self, recipe_id):
+        path = self.get_path('signatures.bin')
+        rows = (recipe_id // GROW_ROWS + 1) * GROW_ROWS
+        with open(path, 'ab') as signatures:
+            # Файл только растёт: под блокировкой размер перепроверяется,
+            # чтобы параллельная запись его не укоротила.
+            fcntl.flock(signatures, fcntl.LOCK_EX)
+            if os.fstat(signatures.fileno()).st_size < rows * SIGNATURE_BYTES:
+                signatures.truncate(rows * SIGNATURE_BYTES)
+
+    def update(self, recipe_id, ingredient_ids):
+        '''
+        Записывает подпись рецепта на место и отмечает его в pending.
+
+        Рецепт без ингредиентов в индекс не попадает: его старая
+        подпись только обнуляется.
+        '''
+        self.write_signature(recipe_id, ingredient_ids)
+        if ingredient_ids:
+            with open(self.get_path('pending.bin'), 'ab') as pending:
+                pending.write(np.int64(recipe_id).tobytes())
+
+    def write_signature(self, recipe_id, ingredient_ids):
+        signatures = self.get_signatures_array()
+        if not ingredient_ids:
+            if signatures is not None and recipe_id < len(signatures):
+                signatures[recipe_id] = 0
+            return
+        os.makedirs(self.path, exist_ok=True)
+        if signatures is None or recipe_id >= len(signatures):
+            self.ensure_capacity(recipe_id)
+            signatures = self.get_signatures_array()
+        _, signature = get_signatures(
+            [recipe_id] * len(ingredient_ids), sorted(ingredient_ids)
+        )
+        signatures[recipe_id] = signature[0]
+
+    def similar(self, recipe_id, limit):
+        '''
+        Похожие рецепты по оценке Жаккара из подписей, по убыванию.
+
+        None, если подписи рецепта ещё нет в индексе.
+        '''
+        signatures = self.get_signatures_array()
+        if signatures is None or recipe_id >= len(signatures):
+            return None
+        signature = np.asarray(signatures[recipe_id])
+        if not signature.any():
+            return None
+        keys = get_band_keys(signature)[0]
+        candidates = []
+        bands = self.get_bands_array()
+        if bands is not None:
+            for band in range(BANDS):
+                band_keys = bands[0, band]
+                start = np.searchsorted(band_keys, keys[band])
+                end = min(
+                    np.searchsorted(band_keys, keys[band], side='right'),
+                    start + MAX_BUCKET,
+                )
+                candidates.append(bands[1, band, start:end])
+        pending = self.get_pending()
+        pending = pending[pending < len(signatures)]
+        if pending.size:
+            matches = (
+                get_band_keys(np.asarray(signatures[pending])) == keys
+            ).any(axis=1)
+            candidates.append(pending[matches])
+        if not candidates:
+            return []
+        candidates = np.unique(np.concatenate(candidates).astype(np.int64))
+        candidates = candidates[
+            (candidates != recipe_id) & (candidates < len(signatures))
+        ]
+        similarity = (np.asarray(signatures[candidates]) == signature).mean(
+            axis=1
+        )
+        found = similarity >= MIN_SIMILARITY
+        candidates, similarity = candidates[found], similarity[found]
+        order = np.lexsort((candidates, -similarity))[:limit]
+        return candidates[order].tolist()
+
+    def rebuild(self, chunks, capacity):
+        '''
+        Пересобирает все файлы индекса по пачкам пар (id рецептов,
+        id ингредиентов), упорядоченных по рецепту. Возвращает число
+        рецептов в индексе.
+        '''
+        os.makedirs(self.path, exist_ok=True)
+        pending_path = self.get_path('pending.bin')
+        if os.path.exists(pending_path):
+            # Рецепты, изменённые во время сборки, попадут в новый
+            # pending.bin, а старый нужен поиску до замены bands.npy.
+            os.replace(pending_path, f'{pending_path}.old')
+        rows = (capacity // GROW_ROWS + 1) * GROW_ROWS
+        path = self.get_path('signatures.bin')
+        signatures = np.memmap(
+            f'{path}.tmp', np.uint32, 'w+', shape=(rows, NUM_PERM)
+        )
+        # Пары одного рецепта могут прийти в двух пачках подряд.
+        for chunk_recipes, chunk_ingredients in chunks:
+            ids, chunk = get_signatures(chunk_recipes, chunk_ingredients)
+            existing = signatures[ids]
+            signatures[ids] = np.where(
+                existing.any(axis=1, keepdims=True),
+                np.minimum(existing, chunk),
+                chunk,
+            )
+        signatures.flush()
+        present = np.flatnonzero(signatures.any(axis=1)).astype(np.uint32)
+        keys = get_band_keys(np.asarray(signatures[present])).T
+        order = np.argsort(keys, axis=1, kind='stable')
+        bands = np.stack(
+            (
+                np.take_along_axis(keys, order, axis=1),
+                present[order],
+            )
+        )
+        del signatures
+        os.replace(f'{path}.tmp', path)
+        with open(self.get_path('bands.npy.tmp'), 'wb') as output:
+            np.save(output, bands)
+        os.replace(self.get_path('bands.npy.tmp'), self.get_path('bands.npy'))
+        if os.path.exists(f'{pending_path}.old'):
+            os.remove(f'{pending_path}.old')
+        return present.size
+
+
+similarity_index = SimilarityIndex(settings.SIMILARITY_INDEX_PATH)
+
+
+def iter_ingredient_pairs(chunk_size=READ_CHUNK):
+    '''Пачки (id рецептов, id ингредиентов) из RecipeIngredient по рецепту.'''
+    rows = (
+        RecipeIngredient.objects.order_by('recipe_id')
+        .values_list('recipe_id', 'ingredients_id')
+        .iterator(chunk_size=chunk_size)
+    )
+    while True:
+        chunk = np.array(list(islice(rows, chunk_size)), np.int64)
+        if not chunk.size:
+            return
+        yield chunk[:, 0], chunk[:, 1]
+
+
+def get_ingredient_ids(recipe_id):
+    return list(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            'ingredients_id', flat=True
+        )
+    )
+
+
+def index_recipe(recipe_id, ingredient_ids):
+    '''
+    Обновляет подпись рецепта после фиксации транзакции.
+
+    Ошибка файлов индекса не должна ломать уже сохранённый рецепт:
+    она пишется в лог, а build_similarity всё пересоберёт.
+    '''
+    try:
+        similarity_index.update(recipe_id, ingredient_ids)
+    except OSError:
+        logger.exception('Не удалось обновить индекс похожих рецептов.')
@@ -0,0 +1,78 @@
+import math
+import os
+
+# Конфигурация gunicorn, подхватывается автоматически из рабочей
+# директории контейнера. Все значения можно переопределить через .env.
+
+
+def read_cgroup_quota():
+    '''
+    Квота процессора контейнера в ядрах или None: cgroup v2 (cpu.max),
+    затем v1 (cpu.cfs_quota_us / cpu.cfs_period_us).
+    '''
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as cpu_max:
+            quota, period = cpu_max.read().split()
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as quota_file:
+                quota = quota_file.read().strip()
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as period_file:
+                period = period_file.read().strip()
+        except OSError:
+            return None
+    if quota in ('max', '-1'):
+        return None
+    return int(quota) / int(period)
+
+
+def get_cpu_count():
+    '''
+    Ядра, доступные контейнеру. os.cpu_count() видит все ядра хоста;
+    здесь берутся ядра из affinity процесса, урезанные квотой cgroup.
+    '''
+    try:
+        cpu_count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpu_count = os.cpu_count() or 1
+    quota = read_cgroup_quota()
+    if quota:
+        cpu_count = min(cpu_count, math.ceil(quota))
+    return max(cpu_count, 1)
+
+
+cpu_count = get_cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# gthread: медленная выгрузка PDF занимает один поток, а не весь воркер.
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', cpu_count * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Каждый поток держит своё соединение с базой, поэтому воркеров
+# не больше, чем DB_CONNECTION_BUDGET // threads. Бюджет - доля
+# max_connections PostgreSQL (по умолчанию 100) на один контейнер
+# бэкенда; остальное - миграциям, manage.py и администраторам.
+db_connection_budget = int(os.getenv('DB_CONNECTION_BUDGET', 80))
+threads = max(min(threads, db_connection_budget), 1)
+workers = max(min(workers, db_connection_budget // threads), 1)
+
+# Приложение, шрифты и каталог тэгов загружаются в мастере до fork.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+os.environ.setdefault('PRELOAD_APP', str(preload_app))
+
+# Перезапуск воркеров ограничивает рост памяти; jitter не даёт
+# всем воркерам перезапуститься одновременно.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Для gthread timeout — это проверка живости воркера, а не лимит
+# на запрос. Лимиты для обычных запросов и выгрузок задаёт nginx
+# (proxy_read_timeout), поэтому здесь берётся больший из них.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+accesslog = '-'
+errorlog = '-'
@@ -1,6 +1,6 @@
+import csv
 import os
 import django
-import pandas as pd
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
@@ -9,9 +9,10 @@ from food.models import Tag
 
 
 def import_data(csv_path):
-    df = pd.read_csv(csv_path)
+    with open(csv_path, encoding='utf-8') as csv_file:
+        rows = list(csv.DictReader(csv_file))
 
-    for index, row in df.iterrows():
+    for row in rows:
         Tag.objects.create(
             name=row['name'], color=row['color'], slug=row['slug']
         )
@@ -1,4 +1,6 @@
 from django.contrib import admin
+
+from backend.pagination import EstimatedCountPaginator
 from users.models import User
 
 
@@ -13,4 +15,6 @@ class UserAdmin(admin.ModelAdmin):
         'is_superuser',
         'is_staff',
     )
-    search_fields = ('first_name', 'email')
+    search_fields = ('=email', '=username')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False